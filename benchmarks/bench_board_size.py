@@ -0,0 +1,60 @@
+"""Measures simulation throughput as the board grows from 4x5 to 64x64
+
+Each board runs the flood solution from bench_incremental_step from the center,
+for width + height frames so the board fills up. Throughput is in cell-steps
+(live cells evaluated) per second.
+
+Usage: python -m benchmarks.bench_board_size [max_size]
+"""
+import sys
+import time
+
+from benchmarks.common import flood_solution
+from xbpgh_sim import *
+
+
+def empty_level(board: Board) -> Level:
+    return Level(
+        level_id=-1,
+        level_name=f"{board.width}x{board.height}",
+        level_index=-1,
+        target_state=State(
+            cell_types=[
+                [CellType.NONE for _ in range(board.height)]
+                for _ in range(board.width)
+            ],
+            horz_connected=[
+                [False for _ in range(board.height)] for _ in range(board.width - 1)
+            ],
+            vert_connected=[
+                [False for _ in range(board.height - 1)] for _ in range(board.width)
+            ],
+        ),
+        board=board,
+    )
+
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    sizes = [(4, 5)] + [(n, n) for n in (8, 16, 32, 64) if n <= max_size]
+    for width, height in sizes:
+        level = empty_level(Board(width, height, num_frames=width + height))
+        solution = flood_solution(Coords(width // 2, height // 2), CellType.SKIN)
+
+        timings = {}
+        for compiled in (False, True):
+            start = time.perf_counter()
+            result = simulate_solution(level, solution, compiled=compiled)
+            timings[compiled] = time.perf_counter() - start
+        # Every state but the last is stepped, plus the stability check
+        cell_steps = sum(len(state.live_cells) for state in result.states)
+
+        print(
+            f"{width:>2}x{height:<2} ({cell_steps:>7} cell-steps): "
+            f"reference {cell_steps / timings[False]:>9.0f} cell-steps/s, "
+            f"compiled {cell_steps / timings[True]:>9.0f} cell-steps/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compares simulate_solution with and without compiled rules
+
+Usage: python -m benchmarks.bench_compiled [num_solutions]
+"""
+import sys
+import time
+
+from benchmarks.common import flood_solution, random_solutions
+from xbpgh_sim import *
+from xbpgh_sim.validation import LEVELS_BY_ID
+
+
+def main():
+    num_solutions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cases = [
+        (LEVELS_BY_ID[level_id], parse_solution(save_string))
+        for level_id, save_string in random_solutions(num_solutions)
+    ]
+    cases += [
+        (LEVELS[0], flood_solution(Coords(1, 2), CellType.SKIN)),
+        (LEVELS[-1], flood_solution(Coords(0, 0), CellType.BONE)),
+    ] * (num_solutions // 100)
+
+    start = time.perf_counter()
+    expected = [simulate_solution(level, solution) for level, solution in cases]
+    reference = time.perf_counter() - start
+
+    # The first pass includes compiling each distinct ruleset
+    compile_rules.cache_clear()
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        results = [
+            simulate_solution(level, solution, compiled=True)
+            for level, solution in cases
+        ]
+        timings.append(time.perf_counter() - start)
+        assert results == expected
+
+    print(
+        f"{len(cases)} solutions: reference {reference / len(cases) * 1e6:.0f} "
+        f"us/solution, compiled {timings[0] / len(cases) * 1e6:.0f} us/solution "
+        f"({reference / timings[0]:.2f}x) cold, "
+        f"{timings[1] / len(cases) * 1e6:.0f} us/solution "
+        f"({reference / timings[1]:.2f}x) cached"
+    )
+
+
+if __name__ == "__main__":
+    main()
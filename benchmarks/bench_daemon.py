@@ -0,0 +1,66 @@
+"""Compares per-call latency of the in-process CLI and the daemon client
+
+Usage: python -m benchmarks.bench_daemon [num_calls]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import random_solutions
+from xbpgh_sim import LEVELS_BY_ID
+
+CLIENT = os.path.join(os.path.dirname(__file__), "..", "xbpgh_sim", "client.py")
+
+
+def time_calls(cmd: list[str], num_calls: int, env: dict) -> tuple[float, bytes]:
+    start = time.perf_counter()
+    for _ in range(num_calls):
+        output = subprocess.run(cmd, env=env, check=True, capture_output=True).stdout
+    return (time.perf_counter() - start) / num_calls, output
+
+
+def main():
+    num_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        save_path = os.path.join(tmpdir, "save.dat")
+        solutions = random_solutions(8)
+        with open(save_path, "w") as f:
+            for i, (level_id, save_string) in enumerate(solutions):
+                f.write(f"Toronto.Solution.{level_id}.{i % 4} = {save_string}\n")
+        level_name = LEVELS_BY_ID[solutions[-1][0]].level_name
+
+        env = dict(os.environ, XBPGH_SIM_SOCKET=os.path.join(tmpdir, "daemon.sock"))
+        daemon = subprocess.Popen(
+            [sys.executable, "-m", "xbpgh_sim", "daemon"],
+            env=env,
+            stdout=subprocess.PIPE,
+        )
+        try:
+            assert daemon.stdout is not None
+            daemon.stdout.readline()  # Wait for "Listening on ..."
+
+            for args in (
+                ["validate_all", "--json", save_path],
+                ["simulate", level_name, str((len(solutions) - 1) % 4), save_path],
+            ):
+                cli, cli_output = time_calls(
+                    [sys.executable, "-m", "xbpgh_sim"] + args, num_calls, env
+                )
+                client, client_output = time_calls(
+                    [sys.executable, "-S", CLIENT] + args, num_calls, env
+                )
+                assert cli_output == client_output
+                print(
+                    f"{args[0]:>12}: in-process {cli * 1e3:.1f} ms/call, "
+                    f"daemon {client * 1e3:.1f} ms/call ({cli / client:.2f}x)"
+                )
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+
+if __name__ == "__main__":
+    main()
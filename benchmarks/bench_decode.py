@@ -0,0 +1,33 @@
+"""Compares per-string parse_solution with batched parse_solutions
+
+Usage: python -m benchmarks.bench_decode [num_solutions]
+"""
+import sys
+import time
+
+from benchmarks.common import random_solutions
+from xbpgh_sim import parse_solution, parse_solutions
+
+
+def main():
+    num_solutions = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    save_strings = [s for _, s in random_solutions(num_solutions)]
+
+    start = time.perf_counter()
+    expected = [parse_solution(save_string) for save_string in save_strings]
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    solutions = list(parse_solutions(save_strings))
+    batched = time.perf_counter() - start
+
+    assert solutions == expected
+    print(
+        f"{num_solutions} solutions: parse_solution {single / num_solutions * 1e6:.1f} "
+        f"us/solution, parse_solutions {batched / num_solutions * 1e6:.1f} "
+        f"us/solution ({single / batched:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
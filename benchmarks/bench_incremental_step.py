@@ -0,0 +1,46 @@
+"""Compares full and incremental (settled-cell) stepping on late-game-heavy runs
+
+Usage: python -m benchmarks.bench_incremental_step [num_runs]
+"""
+import sys
+import time
+
+from benchmarks.common import flood_solution
+from xbpgh_sim import *
+
+
+def run(initial: State, solution: Solution, incremental: bool):
+    state = initial
+    settled = None
+    for _ in range(12):
+        res = simulate_step(state, solution.rules, settled=settled)
+        if incremental:
+            settled = settled_cells(state, solution.rules, res)
+        state = res.state
+
+
+def main():
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cases = [
+        (LEVELS[0], flood_solution(Coords(1, 2), CellType.SKIN)),  # 1-1
+        (LEVELS[8], flood_solution(Coords(1, 2), CellType.FLESH)),  # 3-3
+        (LEVELS[-1], flood_solution(Coords(0, 0), CellType.BONE)),  # editor
+    ]
+    for level, solution in cases:
+        # Built once, so only the stepping is timed
+        initial = simulate_solution(level, solution).states[0]
+        timings = {}
+        for incremental in (False, True):
+            start = time.perf_counter()
+            for _ in range(num_runs):
+                run(initial, solution, incremental)
+            timings[incremental] = (time.perf_counter() - start) / num_runs
+        print(
+            f"{level.level_name:>14}: full {timings[False] * 1e3:.3f} ms/run, "
+            f"incremental {timings[True] * 1e3:.3f} ms/run "
+            f"({timings[False] / timings[True]:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Measures the memory held by parsed solutions
+
+Usage: python -m benchmarks.bench_memory [num_solutions]
+"""
+import gc
+import sys
+import tracemalloc
+
+from benchmarks.common import random_solutions
+from xbpgh_sim import parse_solution
+
+
+def main():
+    num_solutions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    save_strings = [s for _, s in random_solutions(num_solutions)]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    solutions = [parse_solution(save_string) for save_string in save_strings]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # save_string is shared with the input list, so isn't counted
+    print(
+        f"{len(solutions)} solutions: "
+        f"{(after - before) / num_solutions:.0f} bytes/parsed solution"
+    )
+
+
+if __name__ == "__main__":
+    main()
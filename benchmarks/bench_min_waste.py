@@ -0,0 +1,56 @@
+"""Times theoretical_min_waste on random targets
+
+Usage: python -m benchmarks.bench_min_waste [num_targets]
+"""
+import random
+import sys
+import time
+
+from xbpgh_sim import *
+
+
+def random_target(rng: random.Random, width: int = 4, height: int = 5) -> State:
+    cell_types = [
+        [
+            rng.choice([CellType.NONE, CellType.METAL, CellType.FLESH, CellType.BONE])
+            for _ in range(height)
+        ]
+        for _ in range(width)
+    ]
+
+    def connected(a: CellType, b: CellType) -> bool:
+        return a.is_living() and b.is_living() and rng.random() < 0.5
+
+    return State(
+        cell_types=cell_types,
+        horz_connected=[
+            [connected(cell_types[x][y], cell_types[x + 1][y]) for y in range(height)]
+            for x in range(width - 1)
+        ],
+        vert_connected=[
+            [
+                connected(cell_types[x][y], cell_types[x][y + 1])
+                for y in range(height - 1)
+            ]
+            for x in range(width)
+        ],
+    )
+
+
+def main():
+    num_targets = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    rng = random.Random(0)
+    targets = [random_target(rng) for _ in range(num_targets)]
+    start = time.perf_counter()
+    min_wastes = [theoretical_min_waste(target) for target in targets]
+    elapsed = time.perf_counter() - start
+    print(
+        f"{num_targets} random targets: "
+        f"{elapsed / num_targets * 1e3:.2f} ms/target, "
+        f"max theoretical_min_waste {max(min_wastes)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Measures TargetScorer on the final states of random solutions
+
+Usage: python -m benchmarks.bench_scoring [num_states]
+"""
+import sys
+import time
+
+from benchmarks.common import random_solutions
+from xbpgh_sim import *
+
+
+def main():
+    num_states = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    level = LEVELS[0]
+    finals = [
+        simulate_solution(level, parse_solution(save_string)).final_state.pack()
+        for level_id, save_string in random_solutions(2000)
+        if level_id == level.level_id
+    ]
+    packed_states = (finals * (num_states // len(finals) + 1))[:num_states]
+    scorer = target_scorer(level)
+
+    start = time.perf_counter()
+    expected = [scorer.score(packed) for packed in packed_states]
+    single = time.perf_counter() - start
+
+    # Imports numpy
+    scorer.score_batch(finals)
+    start = time.perf_counter()
+    scores = scorer.score_batch(packed_states)
+    batched = time.perf_counter() - start
+
+    assert scores.tolist() == expected
+    print(
+        f"{num_states} states: score {single / num_states * 1e9:.0f} ns/state, "
+        f"score_batch {batched / num_states * 1e9:.0f} ns/state "
+        f"({single / batched:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
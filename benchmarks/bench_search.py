@@ -0,0 +1,29 @@
+"""Generations per second of the island genetic algorithm
+
+Usage: python -m benchmarks.bench_search [level_name] [generations] [islands]
+"""
+import sys
+
+from xbpgh_sim import *
+from xbpgh_sim.__main__ import get_level_from_name
+
+
+def main():
+    level = get_level_from_name(sys.argv[1] if len(sys.argv) > 1 else "B2-3")
+    generations = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    islands = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    config = SearchConfig(num_islands=islands, max_generations=generations)
+    for progress in evolve(level, config):
+        pass
+    best = progress.best
+    print(
+        f"{level.level_name}: {progress.generations_per_second:.1f} generations/s "
+        f"({islands} islands of {config.population_size}, "
+        f"{progress.evaluations_per_second:.0f} simulations/s), "
+        f"best distance {best.distance} after {progress.generation} generations"
+    )
+
+
+if __name__ == "__main__":
+    main()
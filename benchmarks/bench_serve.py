@@ -0,0 +1,114 @@
+"""Load generator for the HTTP validation server (python -m xbpgh_sim serve)
+
+Starts a server on a free local port, then drives it with keep-alive client
+connections for a fixed duration and reports the sustained request rate.
+
+Usage: python -m benchmarks.bench_serve [--connections N] [--duration S]
+           [--distinct N] [--workers N]
+"""
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.common import random_solutions
+
+
+async def client(host, port, requests, deadline, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    while time.monotonic() < deadline:
+        level_id, save_string = requests[i % len(requests)]
+        i += 1
+        body = json.dumps(dict(level_id=level_id, solution=save_string)).encode()
+        start = time.monotonic()
+        writer.write(
+            b"POST /validate HTTP/1.1\r\nHost: localhost\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line == b"\r\n":
+                break
+            key, _, value = line.decode().partition(":")
+            if key.lower() == "content-length":
+                length = int(value)
+        await reader.readexactly(length)
+        latencies.append(time.monotonic() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    writer.close()
+
+
+async def run_load(host, port, connections, duration, requests):
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    deadline = time.monotonic() + duration
+    start = time.monotonic()
+    await asyncio.gather(
+        *(
+            client(
+                host,
+                port,
+                requests[i::connections] or requests,
+                deadline,
+                latencies,
+                statuses,
+            )
+            for i in range(connections)
+        )
+    )
+    elapsed = time.monotonic() - start
+    latencies.sort()
+    print(
+        f"{len(latencies)} requests in {elapsed:.1f} s: "
+        f"{len(latencies) / elapsed:.0f} req/s"
+    )
+    print(f"statuses: {statuses}")
+    print(
+        f"latency p50 {latencies[len(latencies) // 2] * 1e3:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--distinct", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    requests = random_solutions(args.distinct)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "xbpgh_sim", "serve", "--port", str(port)]
+        + (["--workers", str(args.workers)] if args.workers else []),
+        stdout=subprocess.PIPE,
+    )
+    try:
+        assert server.stdout is not None
+        server.stdout.readline()  # Wait for "Listening on ..."
+
+        # First pass mostly misses the result cache, second pass mostly hits it
+        for label in ("cold", "warm"):
+            print(f"== {label} cache")
+            asyncio.run(
+                run_load("127.0.0.1", port, args.connections, args.duration, requests)
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Compares simulating enumerated rulesets separately and with shared prefixes
+
+Enumerates every pair of random rules in the two slots after the rules of the
+solutions in a save file, as an exhaustive search extending them would.
+
+Usage: python -m benchmarks.bench_shared_prefix <save_file> [num_rules]
+"""
+import random
+import sys
+import time
+
+from benchmarks.common import random_rule
+from xbpgh_sim import *
+
+
+def enumerate_rulesets(
+    level: Level, solution: Solution, num_rules: int, seed: int = 0
+) -> list[Solution]:
+    rng = random.Random(seed)
+    cell_types = sorted(
+        {CellType.SEED}
+        | {t for a in level.target_state.cell_types for t in a if t.is_living()},
+        key=lambda t: t.value,
+    )
+    choices = [random_rule(rng, cell_types) for _ in range(num_rules)]
+    used = [rule for rule in solution.rules if rule.target_type != CellType.IGNORE]
+    empty = Rule(CellType.IGNORE, CellType.IGNORE, Direction.RIGHT, Reaction.IGNORE)
+    num_padding = len(solution.rules) - len(used) - 2
+    if num_padding < 0:
+        return []
+    padding = [empty] * num_padding
+    return [
+        Solution(
+            rules=used + [a, b] + padding,
+            start_pos=solution.start_pos,
+            metal_coords=solution.metal_coords,
+        )
+        for a in choices
+        for b in choices
+    ]
+
+
+def main():
+    solutions = parse_save_file(open(sys.argv[1]))
+    num_rules = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    cases = []
+    for level in LEVELS:
+        for solution in solutions[level.level_id].values():
+            rulesets = enumerate_rulesets(level, solution, num_rules)
+            if rulesets:
+                cases.append((level, rulesets))
+    num_solutions = sum(len(rulesets) for _, rulesets in cases)
+
+    start = time.perf_counter()
+    expected = [
+        [simulate_solution(level, solution) for solution in rulesets]
+        for level, rulesets in cases
+    ]
+    separate = time.perf_counter() - start
+
+    stats = SharedPrefixStats()
+    start = time.perf_counter()
+    results = [
+        simulate_shared_prefix(level, rulesets, stats=stats)
+        for level, rulesets in cases
+    ]
+    shared = time.perf_counter() - start
+    assert results == expected
+
+    print(
+        f"{num_solutions} rulesets: separate {separate / num_solutions * 1e6:.0f} "
+        f"us/ruleset, shared prefix {shared / num_solutions * 1e6:.0f} us/ruleset "
+        f"({separate / shared:.2f}x), simulated {stats.num_steps_simulated} of "
+        f"{stats.num_steps} steps"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Solution generators shared by the benchmarks"""
+import random
+
+from xbpgh_sim import *
+
+
+def random_solutions(n: int, seed: int = 0) -> list[tuple[int, str]]:
+    """Random divide/specialize rulesets for levels with a free start position"""
+    rng = random.Random(seed)
+    seed_specs = [CellType.FLESH, CellType.BONE, CellType.SKIN]
+    result = []
+    while len(result) < n:
+        level = rng.choice(LEVELS[:-1])
+        rules = []
+        for _ in range(rng.randrange(2, 8)):
+            if rng.random() < 0.7:
+                neighbor_type = rng.choice(
+                    [CellType.IGNORE, CellType.NONE, CellType.ANY]
+                )
+                neighbor_dir = rng.choice(list(Direction))
+                divide_dir = rng.choice(list(Direction))
+                if neighbor_type == CellType.ANY:
+                    neighbor_dir = divide_dir
+                    neighbor_type = CellType.NONE
+                rule = Rule(
+                    CellType.SEED,
+                    neighbor_type,
+                    neighbor_dir,
+                    Reaction.DIVIDE,
+                    divide_dir=divide_dir,
+                )
+            else:
+                rule = Rule(
+                    CellType.SEED,
+                    CellType.IGNORE,
+                    Direction.RIGHT,
+                    Reaction.SPECIALIZE,
+                    spec_type=rng.choice(seed_specs),
+                )
+            rules.append(rule)
+        rules += [
+            Rule(CellType.IGNORE, CellType.IGNORE, Direction.RIGHT, Reaction.IGNORE)
+            for _ in range(16 - len(rules))
+        ]
+        free = [
+            Coords(x, y)
+            for x in range(4)
+            for y in range(5)
+            if level.target_state.cell_types[x][y] == CellType.NONE
+            or level.target_state.cell_types[x][y].is_living()
+        ]
+        solution = Solution(rules, rng.choice(free), [])
+        result.append((level.level_id, dump_solution(solution)))
+    return result
+
+
+def flood_solution(start_pos: Coords, spec_type: CellType) -> Solution:
+    # Divide in every direction, specialize, then keep trying to divide and fuse:
+    # the board fills up within a few frames and every later frame is spent
+    # re-checking settled cells against rules which are blocked
+    rules = [
+        Rule(
+            CellType.SEED,
+            CellType.IGNORE,
+            Direction.RIGHT,
+            Reaction.DIVIDE,
+            divide_dir=d,
+        )
+        for d in Direction
+    ]
+    rules.append(
+        Rule(
+            CellType.SEED,
+            CellType.IGNORE,
+            Direction.RIGHT,
+            Reaction.SPECIALIZE,
+            spec_type=spec_type,
+        )
+    )
+    rules += [
+        Rule(spec_type, CellType.ANY, d, Reaction.FUSE, fuse_dir=d) for d in Direction
+    ]
+    rules += [
+        Rule(
+            spec_type,
+            CellType.IGNORE,
+            Direction.RIGHT,
+            Reaction.DIVIDE,
+            divide_dir=d,
+        )
+        for d in Direction
+    ]
+    rules += [
+        Rule(CellType.IGNORE, CellType.IGNORE, Direction.RIGHT, Reaction.IGNORE)
+        for _ in range(16 - len(rules))
+    ]
+    return Solution(rules, start_pos, [])
+
+
+def random_rule(rng: random.Random, cell_types: list[CellType]) -> Rule:
+    """A random valid rule targeting and producing cell types from cell_types"""
+    while True:
+        reaction = rng.choice(
+            [
+                Reaction.DIVIDE,
+                Reaction.DIVIDE,
+                Reaction.SPECIALIZE,
+                Reaction.FUSE,
+                Reaction.DIE,
+            ]
+        )
+        # Half of the rules are unconditional
+        neighbor_type = (
+            CellType.IGNORE
+            if rng.random() < 0.5
+            else rng.choice([CellType.NONE, CellType.ANY, *cell_types])
+        )
+        rule = Rule(
+            rng.choice(cell_types),
+            neighbor_type,
+            rng.choice(list(Direction)),
+            reaction,
+            divide_dir=(
+                rng.choice(list(Direction)) if reaction == Reaction.DIVIDE else None
+            ),
+            fuse_dir=rng.choice(list(Direction)) if reaction == Reaction.FUSE else None,
+            spec_type=(
+                rng.choice(cell_types) if reaction == Reaction.SPECIALIZE else None
+            ),
+        )
+        try:
+            rule.check_rule()
+        except AssertionError:
+            continue
+        return rule
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from benchmarks.common import flood_solution, random_rule
+from xbpgh_sim import *
+
+
+def _random_solution(rng: random.Random, level: Level) -> Solution:
+    cell_types = sorted(
+        {CellType.SEED}
+        | {t for a in level.target_state.cell_types for t in a if t.is_living()},
+        key=lambda t: t.value,
+    )
+    rules = [random_rule(rng, cell_types) for _ in range(rng.randint(1, 8))]
+    rules += [
+        Rule(CellType.IGNORE, CellType.IGNORE, Direction.RIGHT, Reaction.IGNORE)
+        for _ in range(16 - len(rules))
+    ]
+    # Includes start positions on metal, which fail to simulate
+    start_pos = Coords(
+        rng.randrange(level.board.width), rng.randrange(level.board.height)
+    )
+    return Solution(rules, start_pos, [])
+
+
+@pytest.fixture(scope="session")
+def random_cases() -> list[tuple[Level, Solution]]:
+    """Random rulesets (see benchmarks.common.random_rule) on every level"""
+    rng = random.Random(0)
+    return [
+        (level, _random_solution(rng, level)) for level in LEVELS for _ in range(20)
+    ]
+
+
+@pytest.fixture(scope="session")
+def flood_cases() -> list[tuple[Level, Solution]]:
+    """Solutions which fill the board and then keep re-checking settled cells"""
+    return [
+        (LEVELS[0], flood_solution(Coords(1, 2), CellType.SKIN)),
+        (LEVELS[8], flood_solution(Coords(1, 2), CellType.FLESH)),
+        (LEVELS[-1], flood_solution(Coords(0, 0), CellType.BONE)),
+    ]
@@ -0,0 +1,22 @@
+import pytest
+
+from xbpgh_sim import *
+
+
+@pytest.mark.parametrize("level", LEVELS, ids=lambda level: level.level_name)
+def test_theoretical_min_waste_of_levels(level):
+    """The hand-entered values of LEVELS match the computed ones"""
+    assert level.theoretical_min_waste == theoretical_min_waste(level.target_state)
+
+
+def test_level_derives_theoretical_min_waste():
+    for level in LEVELS:
+        derived = Level(
+            level_id=level.level_id,
+            level_name=level.level_name,
+            level_index=level.level_index,
+            target_state=level.target_state,
+            can_place_metal=level.can_place_metal,
+            board=level.board,
+        )
+        assert derived.theoretical_min_waste == level.theoretical_min_waste
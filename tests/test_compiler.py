@@ -0,0 +1,43 @@
+from xbpgh_sim import *
+
+
+def _outcome(level: Level, solution: Solution, compiled: bool):
+    """The result of simulate_solution, or the type and message of its error"""
+    try:
+        return simulate_solution(level, solution, compiled=compiled)
+    except Exception as e:
+        return type(e), str(e)
+
+
+def test_compiled_matches_reference(random_cases, flood_cases):
+    num_errors = 0
+    for level, solution in random_cases + flood_cases:
+        expected = _outcome(level, solution, compiled=False)
+        assert _outcome(level, solution, compiled=True) == expected, solution
+        num_errors += isinstance(expected, tuple)
+    # Both paths are exercised
+    assert 0 < num_errors < len(random_cases)
+
+
+def test_compiled_metrics_match_reference(random_cases):
+    for level, solution in random_cases:
+        try:
+            expected = simulate_metrics(level, solution)
+        except StartPositionError:
+            continue
+        assert simulate_metrics(level, solution, compiled=True) == expected
+
+
+def test_compiled_step_matches_simulate_step(random_cases, flood_cases):
+    for level, solution in random_cases + flood_cases:
+        try:
+            state = simulate_solution(level, solution).states[0]
+        except StartPositionError:
+            continue
+        step = compile_rules(
+            tuple(solution.rules), level.board.width, level.board.height
+        )
+        for _ in range(level.board.num_frames):
+            expected = simulate_step(state, solution.rules)
+            assert step(state) == expected
+            state = expected.state
@@ -0,0 +1,33 @@
+import pytest
+
+from xbpgh_sim import *
+
+
+def test_malformed_keys_are_ignored(tmp_path):
+    dump = tmp_path / "dump.txt"
+    dump.write_text(
+        "alice Toronto.Solution.abc.1 = x\n"
+        "alice Toronto.Solution.1.0 = abc\n"
+        "bob Toronto.Solution.1.0 = def\n"
+    )
+    assert build_corpus_index(str(dump)) == 2
+    with CorpusStore(str(dump)) as store:
+        assert [r.save_string for r in store.lookup(1, 0)] == ["abc", "def"]
+        assert [r.player for r in store.lookup(1, 0, "bob")] == ["bob"]
+
+
+def test_empty_dump(tmp_path):
+    dump = tmp_path / "dump.txt"
+    dump.write_text("")
+    assert build_corpus_index(str(dump)) == 0
+    with CorpusStore(str(dump)) as store:
+        assert len(store) == 0
+        assert store.lookup(1, 0) == []
+
+
+def test_empty_index(tmp_path):
+    dump = tmp_path / "dump.txt"
+    dump.write_text("")
+    (tmp_path / "dump.txt.idx").write_bytes(b"")
+    with pytest.raises(ValueError):
+        CorpusStore(str(dump))
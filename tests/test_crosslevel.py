@@ -0,0 +1,35 @@
+import dataclasses
+
+from xbpgh_sim import *
+
+
+def test_metal_solutions_only_solve_metal_levels():
+    # A solution placing metal where its target already has metal starts from
+    # the same state on both levels, but is only valid where metal is allowed
+    solution = Solution(
+        [
+            Rule(
+                CellType.SEED,
+                CellType.IGNORE,
+                Direction.RIGHT,
+                Reaction.DIVIDE,
+                divide_dir=Direction.UP,
+            ),
+        ]
+        + [
+            Rule(CellType.IGNORE, CellType.IGNORE, Direction.RIGHT, Reaction.IGNORE)
+            for _ in range(15)
+        ],
+        Coords(1, 1),
+        [Coords(3, 4)],
+    )
+    editor = LEVELS[-1]
+    assert editor.can_place_metal
+    target = simulate_solution(editor, solution).final_state
+    metal = dataclasses.replace(editor, level_id=1001, target_state=target)
+    no_metal = dataclasses.replace(
+        editor, level_id=1002, target_state=target, can_place_metal=False
+    )
+
+    for levels in ([metal, no_metal], [no_metal, metal]):
+        assert solved_levels(solution, levels) == [metal]
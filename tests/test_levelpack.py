@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from xbpgh_sim import *
+
+
+def _empty_target(width: int = 4, height: int = 5) -> str:
+    return State(
+        [[CellType.NONE] * height for _ in range(width)],
+        [[False] * height for _ in range(width - 1)],
+        [[False] * (height - 1) for _ in range(width)],
+    ).visualize()
+
+
+def _write_pack(tmp_path, target: str = _empty_target(), **level):
+    path = tmp_path / "pack.json"
+    entry = dict(level_id=950, level_name="Empty", target=target, **level)
+    path.write_text(
+        json.dumps(
+            dict(format="xbpgh_sim level pack", version=1, name="t", levels=[entry])
+        )
+    )
+    return str(path)
+
+
+def _solution(start_pos: Coords, metal_coords: list[Coords]) -> Solution:
+    return Solution(
+        [
+            Rule(CellType.IGNORE, CellType.IGNORE, Direction.RIGHT, Reaction.IGNORE)
+            for _ in range(16)
+        ],
+        start_pos,
+        metal_coords,
+    )
+
+
+@pytest.mark.parametrize("min_waste", ["3", 1.5, True, -1])
+def test_invalid_min_waste(tmp_path, min_waste):
+    path = _write_pack(tmp_path, theoretical_min_waste=min_waste)
+    with pytest.raises(ValueError, match="theoretical_min_waste"):
+        load_level_pack(path)
+
+
+def test_min_waste(tmp_path):
+    pack = load_level_pack(_write_pack(tmp_path, theoretical_min_waste=2))
+    assert pack.levels[0].theoretical_min_waste == 2
+
+
+@pytest.mark.parametrize("size", [dict(width=0), dict(height=-1), dict(num_frames=0)])
+def test_invalid_board(tmp_path, size):
+    with pytest.raises(ValueError, match="board"):
+        load_level_pack(_write_pack(tmp_path, **size))
+
+
+def test_small_board(tmp_path):
+    # Saved positions are on the 4 x 5 board
+    path = _write_pack(
+        tmp_path, _empty_target(2, 2), width=2, height=2, can_place_metal=True
+    )
+    (level,) = load_level_pack(path).levels
+    assert simulate_solution(level, _solution(Coords(1, 1), [])).metrics
+    with pytest.raises(StartPositionError):
+        simulate_solution(level, _solution(Coords(3, 4), []))
+    with pytest.raises(MetalPositionError):
+        simulate_solution(level, _solution(Coords(0, 0), [Coords(0, 3)]))
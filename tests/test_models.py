@@ -0,0 +1,16 @@
+from xbpgh_sim import *
+
+
+def test_packed_states_on_large_board():
+    # More cells than 16 bit indices can address
+    width, height = 300, 300
+    state = State(
+        [[CellType.NONE] * height for _ in range(width)],
+        [[False] * height for _ in range(width - 1)],
+        [[False] * (height - 1) for _ in range(width)],
+    )
+    state.cell_types[width - 1][height - 1] = CellType.SEED
+    state.live_cells = [Coords(width - 1, height - 1)]
+    states = PackedStates(width, height)
+    states.append(state)
+    assert states[0] == state
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from benchmarks.common import random_rule
+from xbpgh_sim import *
+
+
+def _enumerated_rulesets(
+    rng: random.Random, level: Level, num_choices: int
+) -> list[Solution]:
+    """Every pair of random rules after a shared random prefix, as an
+    exhaustive search would enumerate them"""
+    cell_types = sorted(
+        {CellType.SEED}
+        | {t for a in level.target_state.cell_types for t in a if t.is_living()},
+        key=lambda t: t.value,
+    )
+    prefix = [random_rule(rng, cell_types) for _ in range(rng.randint(0, 4))]
+    choices = [random_rule(rng, cell_types) for _ in range(num_choices)]
+    empty = Rule(CellType.IGNORE, CellType.IGNORE, Direction.RIGHT, Reaction.IGNORE)
+    padding = [empty] * (16 - len(prefix) - 2)
+    free = [
+        Coords(x, y)
+        for x in range(level.board.width)
+        for y in range(level.board.height)
+        if level.target_state.cell_types[x][y] != CellType.METAL
+    ]
+    start_positions = rng.sample(free, 2)
+    return [
+        Solution(prefix + [a, b] + padding, rng.choice(start_positions), [])
+        for a in choices
+        for b in choices
+    ]
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_shared_prefix_matches_independent_simulation(compiled):
+    rng = random.Random(0)
+    stats = SharedPrefixStats()
+    for level in LEVELS:
+        solutions = _enumerated_rulesets(rng, level, 6)
+        expected = [simulate_solution(level, solution) for solution in solutions]
+        results = simulate_shared_prefix(level, solutions, compiled, stats)
+        assert results == expected
+    assert stats.num_steps_simulated < stats.num_steps
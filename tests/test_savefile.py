@@ -0,0 +1,44 @@
+import io
+
+import pytest
+
+from benchmarks.common import random_solutions
+from xbpgh_sim import *
+
+
+def test_parse_save_file_matches_parse_solution():
+    entries = random_solutions(600)
+    save = "".join(
+        f"Toronto.Solution.{level_id}.{slot} = {save_string}\n"
+        for slot, (level_id, save_string) in enumerate(entries)
+    )
+    solutions = parse_save_file(io.StringIO(save))
+    for slot, (level_id, save_string) in enumerate(entries):
+        assert solutions[level_id][slot] == parse_solution(save_string)
+
+
+def test_parse_save_file_errors_in_line_order():
+    ((level_id, save_string),) = random_solutions(1)
+    save = (
+        "Toronto.Solution.1.0 = abc\n"
+        f"Toronto.Solution.{level_id}.1 = {save_string}\n"
+        "Toronto.Solution.999.0 = abc\n"
+        "Toronto.Solution.x = abc\n"
+    )
+    errors = ErrorLog()
+    solutions = parse_save_file(io.StringIO(save), errors=errors)
+    assert solutions[level_id] == {1: parse_solution(save_string)}
+    assert errors.counts == {"decode": 2, "unknown_level": 1}
+
+    # Without an ErrorLog, the first error in the file is raised
+    with pytest.raises(SolutionError, match="Undecodable"):
+        parse_save_file(io.StringIO(save))
+
+
+def test_parsed_rules_are_not_shared():
+    ((_, save_string),) = random_solutions(1)
+    a = parse_solution(save_string)
+    b = parse_solution(save_string)
+    assert a.rules[0] == b.rules[0] and a.rules[0] is not b.rules[0]
+    a.rules[0].target_type = CellType.IGNORE
+    assert b == parse_solution(save_string)
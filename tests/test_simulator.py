@@ -0,0 +1,41 @@
+from xbpgh_sim import *
+
+
+def test_settled_cells_keep_step_results(random_cases, flood_cases):
+    """Skipping settled cells gives the same steps as evaluating every cell"""
+    num_settled = 0
+    for level, solution in random_cases + flood_cases:
+        try:
+            state = simulate_solution(level, solution).states[0]
+        except StartPositionError:
+            continue
+        settled = None
+        for _ in range(level.board.num_frames + 1):
+            expected = simulate_step(state, solution.rules)
+            res = simulate_step(state, solution.rules, settled=settled)
+            assert res == expected
+            settled = settled_cells(state, solution.rules, res)
+            num_settled += len(settled)
+            state = res.state
+    assert num_settled > 0
+
+
+def test_simulate_solution_matches_full_steps(random_cases, flood_cases):
+    for level, solution in random_cases + flood_cases:
+        try:
+            result = simulate_solution(level, solution)
+        except StartPositionError:
+            continue
+        state = result.states[0]
+        states = [state]
+        rules_applied = []
+        for _ in range(level.board.num_frames):
+            res = simulate_step(state, solution.rules)
+            state = res.state
+            states.append(state)
+            rules_applied.append(res.rules_applied)
+        assert list(result.states) == states
+        assert list(result.rules_applied) == rules_applied
+        assert result.metrics.is_stable == (
+            not simulate_step(state, solution.rules).did_change
+        )
@@ -0,0 +1,20 @@
+from xbpgh_sim import *
+
+
+def test_trajectory_stats_match_groups(random_cases, flood_cases):
+    results = []
+    for level, solution in random_cases + flood_cases:
+        try:
+            results.append(simulate_solution(level, solution))
+        except StartPositionError:
+            continue
+    # Each solution twice, so every class has at least two results
+    results += results
+    groups = group_by_trajectory(results)
+    stats = trajectory_stats(results)
+    assert stats.num_results == len(results)
+    assert stats.num_trajectories == len(groups)
+    for level_id, num_trajectories in stats.trajectories_per_level.items():
+        sizes = [len(g) for (i, _), g in groups.items() if i == level_id]
+        assert num_trajectories == len(sizes)
+        assert stats.largest_class_per_level[level_id] == max(sizes) >= 2
@@ -1,4 +1,20 @@
 from .models import *
+from .errors import *
 from .levels import *
 from .savefile import *
 from .simulator import *
+from .compiler import *
+from .prefix import *
+from .analysis import *
+from .bounds import *
+from .scoring import *
+from .canonical import *
+from .trajectory import *
+from .crosslevel import *
+from .levelpack import *
+from .validation import *
+from .merge import *
+from .corpus import *
+from .export import *
+from .checkpoint import *
+from .search import *
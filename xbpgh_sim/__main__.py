@@ -1,14 +1,24 @@
 import sys
 
 import argparse
+import contextlib
 import json
 import dataclasses
 from typing import Optional
 
 from .models import *
+from .errors import *
 from .savefile import *
 from .levels import *
 from .simulator import *
+from .analysis import *
+from .bounds import *
+from .validation import *
+from .merge import *
+from .corpus import *
+from .export import *
+from .levelpack import *
+from .trajectory import *
 
 
 def get_level_from_name(level_name) -> Optional[Level]:
@@ -36,11 +46,42 @@ def get_level_from_name(level_name) -> Optional[Level]:
     raise ValueError(f"Could not parse level name {level_name}")
 
 
-def main():
+def main(argv: Optional[list[str]] = None, excluded_commands: frozenset = frozenset()):
     parser = argparse.ArgumentParser(
         prog="python -m xbpgh_sim", description="Simulate X'BPGH solutions"
     )
-    subparsers = parser.add_subparsers()
+    parser.add_argument(
+        "--level-pack",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="Also use the levels of this level pack (can be repeated)",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    # Packs are loaded before parsing, so level names can refer to their levels
+    pack_parser = argparse.ArgumentParser(add_help=False)
+    pack_parser.add_argument("--level-pack", action="append", default=[])
+    packs = [
+        load_level_pack(path)
+        for path in pack_parser.parse_known_args(argv)[0].level_pack
+    ]
+    levels = merge_levels(packs)
+    levels_by_id = {level.level_id: level for level in levels}
+
+    def level_from_name(level_name) -> Optional[Level]:
+        for pack in packs:
+            level = pack.get_level(level_name)
+            if level is not None:
+                # The merged copy, with its level_index among all packs
+                return levels_by_id[level.level_id]
+        return get_level_from_name(level_name)
+
+    def level_bounds(level: Level) -> MetricBounds:
+        for pack in packs:
+            if level.level_id in pack.by_id:
+                return pack.metric_bounds(level.level_id)
+        return metric_bounds(level)
 
     parser_validate_all = subparsers.add_parser(
         "validate_all", help="Validate all solutions in a save file"
@@ -48,64 +89,148 @@ def main():
     parser_validate_all.add_argument(
         "save_file", type=argparse.FileType(), help="Save file path (or - for stdin)"
     )
-    parser_validate_all.add_argument(
+    output_validate_all = parser_validate_all.add_mutually_exclusive_group()
+    output_validate_all.add_argument(
         "--json", action="store_true", help="Use JSON output mode"
     )
     parser_validate_all.add_argument(
         "--include-solution", action="store_true", help="Include the solution save"
     )
+    parser_validate_all.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help='Only validate shard i of N ("i/N"), partitioned by solution hash',
+    )
+    output_validate_all.add_argument(
+        "--npy",
+        default=None,
+        help="Append results to this NumPy .npy file instead of printing them",
+    )
+    parser_validate_all.add_argument(
+        "--include-unreachable",
+        action="store_true",
+        help="List the target cell types each solution's rules can never produce in JSON records",
+    )
+    parser_validate_all.add_argument(
+        "--trajectory-stats",
+        action="store_true",
+        help="At the end, write the number of distinct trajectories (state sequences) and the largest group of solutions sharing one, per level, to stderr as JSON",
+    )
+    parser_validate_all.add_argument(
+        "--skip-unsolvable",
+        action="store_true",
+        help="Don't simulate solutions whose rules can never produce some target cell type, and report them as incorrect without metrics",
+    )
+    parser_validate_all.add_argument(
+        "--keep-going",
+        action="store_true",
+        help="Skip solutions which fail to parse or simulate, writing their errors to stderr as JSON lines and a summary of them by category at the end",
+    )
+    parser_validate_all.add_argument(
+        "--errors",
+        type=argparse.FileType("w"),
+        default=None,
+        help="Write the errors of --keep-going to this file instead (implies --keep-going)",
+    )
 
     def run_validate_all(args):
-        solutions = parse_save_file(args.save_file)
+        errors = (
+            ErrorLog(args.errors or sys.stderr)
+            if args.keep_going or args.errors
+            else None
+        )
+        solutions = parse_save_file(args.save_file, levels, errors)
 
         json_result = []
+        writer = ResultsWriter(args.npy) if args.npy else None
 
         for level in LEVELS:
             assert level.target_state == State.from_visualize(
                 level.target_state.visualize()
             )
-            for slot, solution in solutions[level.level_id].items():
-                result = simulate_solution(level, solution)
-                if args.json:
-                    json_result.append(
-                        dict(
-                            level_name=level.level_name,
-                            level_id=level.level_id,
-                            slot_id=slot,
-                            **(
-                                dict(solution=f"Toronto.Solution.{level.level_id}.0 = {solution.save_string}")
-                                if args.include_solution
-                                else {}
-                            ),
-                            **dataclasses.asdict(result.metrics),
-                        )
+
+        # Rows for writer, appended in batches as they are produced so an
+        # interrupted run keeps what it has validated so far
+        rows = []
+        trajectories = TrajectoryCounter() if args.trajectory_stats else None
+        for level, slot, solution, unreachable, result in simulate_save(
+            solutions, args.shard, levels, errors, args.skip_unsolvable
+        ):
+            if trajectories is not None and result is not None:
+                trajectories.add(result)
+            if writer is not None:
+                if result is not None:
+                    rows.append(
+                        (level.level_id, slot, solution.save_string, result.metrics)
                     )
-                else:
-                    print(f"{level.level_name} (Level ID {level.level_id}, Slot {slot})")
-                    print(result.metrics)
-                    if not result.metrics.is_correct:
-                        print("  Have         Want")
-                        print(
-                            "\n".join(
-                                a + "    " + b
-                                for a, b in zip(
-                                    result.final_state.visualize().split("\n"),
-                                    result.level.target_state.visualize().split("\n"),
-                                )
-                            )
+                    if len(rows) >= 256:
+                        writer.append(rows)
+                        rows = []
+                continue
+            if args.json:
+                json_result.append(
+                    validation_record(
+                        level,
+                        slot,
+                        solution,
+                        None if result is None else result.metrics,
+                        args.include_solution,
+                        (
+                            unreachable
+                            if args.include_unreachable or result is None
+                            else None
+                        ),
+                    )
+                )
+                continue
+
+            print(f"{level.level_name} (Level ID {level.level_id}, Slot {slot})")
+            if result is None:
+                print(
+                    "  Unsolvable, unreachable target cell types:",
+                    ", ".join(type_names(unreachable)),
+                )
+                continue
+            print(result.metrics)
+            optimal = level_bounds(level).proven_optimal(result.metrics)
+            if optimal:
+                print("  Provably optimal:", ", ".join(optimal))
+            if not result.metrics.is_correct:
+                if unreachable:
+                    print(
+                        "  Unreachable target cell types:",
+                        ", ".join(type_names(unreachable)),
+                    )
+                print("  Have         Want")
+                print(
+                    "\n".join(
+                        a + "    " + b
+                        for a, b in zip(
+                            result.final_state.visualize().split("\n"),
+                            result.level.target_state.visualize().split("\n"),
                         )
-                        print()
+                    )
+                )
+                print()
 
-        if args.json:
+        if writer is not None:
+            writer.append(rows)
+            writer.close()
+        elif args.json:
             print(json.dumps(json_result))
+        if trajectories is not None:
+            print(json.dumps(dataclasses.asdict(trajectories.stats())), file=sys.stderr)
+        if errors is not None:
+            print(errors.summary(), file=sys.stderr)
 
     parser_validate_all.set_defaults(func=run_validate_all)
 
     parser_simulate = subparsers.add_parser("simulate", help="Simulate one save")
     parser_simulate.add_argument(
         "level_name",
-        type=get_level_from_name,
-        help='Use "1-2" for the 2nd level in the 1st column of the base game, or "B4-3" for the 3rd level in the 4th column of the bonus levels, or a bonus level name (e.g. "Clark"). Use "B5-3" or "editor" for the puzzle editor.',
+        type=level_from_name,
+        help='Use "1-2" for the 2nd level in the 1st column of the base game, or "B4-3" for the 3rd level in the 4th column of the bonus levels, or a bonus level name (e.g. "Clark"). Use "B5-3" or "editor" for the puzzle editor. Level pack levels can be given by name or ID.',
     )
     parser_simulate.add_argument(
         "slot_number",
@@ -117,7 +242,7 @@ def main():
     )
 
     def run_simulate(args):
-        solutions = parse_save_file(args.save_file)
+        solutions = parse_save_file(args.save_file, levels)
         level = args.level_name
         slot = args.slot_number
         if slot not in solutions[level.level_id]:
@@ -133,16 +258,16 @@ def main():
         print("Metrics:")
         for field in dataclasses.fields(Metrics):
             print(field.name, "=", getattr(result.metrics, field.name))
-        assert len(result.states) == 12
+        assert len(result.states) == level.board.num_frames + 1
         print("Simulation:")
-        for i in range(2):
+        for i in range(0, len(result.states), 6):
             print(
                 "\n".join(
                     " ".join(segments)
                     for segments in zip(
                         *(
                             state.visualize().split("\n")
-                            for state in result.states[6 * i : 6 * i + 6]
+                            for state in result.states[i : i + 6]
                         )
                     )
                 )
@@ -168,7 +293,360 @@ def main():
 
     parser_simulate.set_defaults(func=run_simulate)
 
-    args = parser.parse_args()
+    parser_validate_stream = subparsers.add_parser(
+        "validate_stream",
+        help="Validate solutions read line by line from stdin, writing JSON lines",
+    )
+    parser_validate_stream.add_argument(
+        "--ordered",
+        action="store_true",
+        help="Write results in input order instead of as they complete",
+    )
+    parser_validate_stream.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of simulation worker processes (default: CPU count)",
+    )
+    parser_validate_stream.add_argument(
+        "--max-pending",
+        type=int,
+        default=64,
+        help="Maximum number of records in flight",
+    )
+    parser_validate_stream.add_argument(
+        "--include-solution", action="store_true", help="Include the solution save"
+    )
+    parser_validate_stream.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help='Only validate shard i of N ("i/N"), partitioned by solution hash',
+    )
+    parser_validate_stream.add_argument(
+        "--output", default=None, help="Write results to this file instead of stdout"
+    )
+    parser_validate_stream.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Periodically save progress to this file (needs --output, implies --ordered)",
+    )
+    parser_validate_stream.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from --checkpoint, given the same input",
+    )
+    parser_validate_stream.add_argument(
+        "--npy",
+        default=None,
+        help="Append results to this NumPy .npy file, as validate_all --npy does, and only write errors as JSON lines",
+    )
+
+    def run_validate_stream(args):
+        from .checkpoint import Checkpoint
+        from .stream import validate_stream
+
+        if args.checkpoint is not None and args.output is None:
+            parser_validate_stream.error("--checkpoint needs --output")
+        checkpoint = (
+            Checkpoint(args.checkpoint, "validate_stream")
+            if args.checkpoint is not None
+            else None
+        )
+        if args.output is None:
+            out = sys.stdout
+        elif checkpoint is not None and args.resume and checkpoint.load() is not None:
+            out = open(args.output, "r+")
+        else:
+            out = open(args.output, "w")
+
+        writer = ResultsWriter(args.npy) if args.npy else None
+        # Only close files opened here, not stdout
+        with out if out is not sys.stdout else contextlib.nullcontext(out):
+            validate_stream(
+                sys.stdin,
+                out,
+                ordered=args.ordered or checkpoint is not None,
+                workers=args.workers,
+                max_pending=args.max_pending,
+                include_solution=args.include_solution,
+                shard=args.shard,
+                levels=levels if packs else None,
+                checkpoint=checkpoint,
+                resume=args.resume,
+                writer=writer,
+            )
+        if writer is not None:
+            writer.close()
+
+    parser_validate_stream.set_defaults(func=run_validate_stream)
+
+    parser_merge = subparsers.add_parser(
+        "merge",
+        help="Merge validate_all --json, validate_stream or --npy results into a per-level report",
+    )
+    parser_merge.add_argument(
+        "result_files",
+        nargs="+",
+        help="Result file paths (or - for stdin); .npy files are read as exported results",
+    )
+
+    def run_merge(args):
+        print(
+            json.dumps(
+                merge_results(
+                    result
+                    for path in args.result_files
+                    for result in read_result_file(path)
+                )
+            )
+        )
+
+    parser_merge.set_defaults(func=run_merge)
+
+    parser_corpus_index = subparsers.add_parser(
+        "corpus_index", help="Build the sidecar index of a corpus dump"
+    )
+    parser_corpus_index.add_argument(
+        "dump_file",
+        help="Corpus dump path, with lines of the form [<player_id> ]Toronto.Solution.<level_id>.<slot> = <solution>",
+    )
+
+    def run_corpus_index(args):
+        num_entries = build_corpus_index(args.dump_file)
+        print(f"Indexed {num_entries} solutions")
+
+    parser_corpus_index.set_defaults(func=run_corpus_index)
+
+    parser_corpus_validate = subparsers.add_parser(
+        "corpus_validate",
+        help="Validate the solutions in one slot of an indexed corpus dump",
+    )
+    parser_corpus_validate.add_argument("dump_file", help="Corpus dump path")
+    parser_corpus_validate.add_argument(
+        "level_name", type=level_from_name, help="Level, as for simulate"
+    )
+    parser_corpus_validate.add_argument("slot_number", type=int, help="Slot number")
+    parser_corpus_validate.add_argument(
+        "--player", default=None, help="Only validate this player's solutions"
+    )
+
+    def run_corpus_validate(args):
+        level = args.level_name
+        with CorpusStore(args.dump_file) as store:
+            records = store.lookup(level.level_id, args.slot_number, args.player)
+        print(
+            json.dumps(
+                [
+                    dict(
+                        player=record.player,
+                        **validation_record(
+                            level,
+                            record.slot,
+                            solution,
+                            simulate_solution(level, solution).metrics,
+                        ),
+                    )
+                    for record, solution in zip(
+                        records,
+                        parse_solutions(record.save_string for record in records),
+                    )
+                ]
+            )
+        )
+
+    parser_corpus_validate.set_defaults(func=run_corpus_validate)
+
+    parser_watch = subparsers.add_parser(
+        "watch", help="Revalidate solutions in a save file whenever they change"
+    )
+    parser_watch.add_argument("save_file", help="Save file path")
+    parser_watch.add_argument(
+        "--interval", type=float, default=1.0, help="Seconds between polls"
+    )
+    parser_watch.add_argument(
+        "--json", action="store_true", help="Use JSON lines output mode"
+    )
+
+    def run_watch(args):
+        from .watch import SaveFileWatcher
+
+        for updates in SaveFileWatcher(args.save_file, levels).watch(args.interval):
+            for update in updates:
+                level = update.level
+                if args.json:
+                    if update.result is not None:
+                        assert update.solution is not None
+                        record = validation_record(
+                            level, update.slot, update.solution, update.result.metrics
+                        )
+                    else:
+                        record = dict(
+                            level_name=level.level_name,
+                            level_id=level.level_id,
+                            slot_id=update.slot,
+                            **(
+                                dict(error=update.error)
+                                if update.error is not None
+                                else dict(removed=True)
+                            ),
+                        )
+                    print(json.dumps(record), flush=True)
+                else:
+                    print(
+                        f"{level.level_name} (Level ID {level.level_id}, Slot {update.slot})"
+                    )
+                    if update.result is not None:
+                        print(update.result.metrics)
+                    elif update.error is not None:
+                        print(f"Invalid solution: {update.error}")
+                    else:
+                        print("Removed")
+                    sys.stdout.flush()
+
+    parser_watch.set_defaults(func=run_watch)
+
+    parser_search = subparsers.add_parser(
+        "search", help="Search for solutions to a level with a genetic algorithm"
+    )
+    parser_search.add_argument(
+        "level_name", type=level_from_name, help="Level, as for simulate"
+    )
+    parser_search.add_argument(
+        "--islands", type=int, default=4, help="Number of separately evolving islands"
+    )
+    parser_search.add_argument(
+        "--population", type=int, default=64, help="Candidates per island"
+    )
+    parser_search.add_argument(
+        "--generations",
+        type=int,
+        default=None,
+        help="Generations per island (default: until interrupted or optimal)",
+    )
+    parser_search.add_argument(
+        "--max-rules", type=int, default=8, help="Maximum number of rules"
+    )
+    parser_search.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser_search.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: one per island)",
+    )
+    parser_search.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Save progress to this file periodically and when interrupted",
+    )
+    parser_search.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from --checkpoint, given the same options",
+    )
+
+    def run_search(args):
+        from .checkpoint import Checkpoint
+        from .search import SearchConfig, evolve
+
+        try:
+            config = SearchConfig(
+                num_islands=args.islands,
+                population_size=args.population,
+                max_rules=args.max_rules,
+                max_generations=args.generations,
+                seed=args.seed,
+            )
+        except ValueError as e:
+            parser_search.error(str(e))
+        best = None
+        try:
+            for progress in evolve(
+                args.level_name,
+                config,
+                args.workers,
+                checkpoint=(
+                    Checkpoint(args.checkpoint, "search")
+                    if args.checkpoint is not None
+                    else None
+                ),
+                resume=args.resume,
+            ):
+                best = progress.best
+                print(
+                    f"Generation {progress.generation}"
+                    f" ({progress.generations_per_second:.1f} gen/s,"
+                    f" {progress.evaluations_per_second:.0f} sims/s):"
+                    f" distance {best.distance:g}, {best.metrics}"
+                )
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+        if best is not None:
+            if progress.is_optimal:
+                print("Provably optimal")
+            print("Best solution:")
+            print(best.solution().save_string)
+
+    parser_search.set_defaults(func=run_search)
+
+    parser_serve = subparsers.add_parser(
+        "serve", help="Run an HTTP validation server"
+    )
+    parser_serve.add_argument("--host", default="127.0.0.1", help="Host to bind")
+    parser_serve.add_argument("--port", type=int, default=8000, help="Port to bind")
+    parser_serve.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of simulation worker processes (default: CPU count)",
+    )
+    parser_serve.add_argument(
+        "--cache-size", type=int, default=65536, help="Number of cached results"
+    )
+    parser_serve.add_argument(
+        "--max-pending",
+        type=int,
+        default=256,
+        help="Requests in flight before new ones are rejected with 503",
+    )
+
+    def run_serve(args):
+        from .server import serve
+
+        serve(
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            cache_size=args.cache_size,
+            max_pending=args.max_pending,
+            levels=levels if packs else None,
+        )
+
+    parser_serve.set_defaults(func=run_serve)
+
+    parser_daemon = subparsers.add_parser(
+        "daemon",
+        help="Serve commands from xbpgh_sim/client.py over a Unix socket",
+    )
+    parser_daemon.add_argument(
+        "--socket",
+        default=None,
+        help="Socket path (default: $XBPGH_SIM_SOCKET, or xbpgh_sim-<uid>.sock in $XDG_RUNTIME_DIR or the temp dir)",
+    )
+
+    def run_daemon_command(args):
+        from .client import default_socket_path
+        from .daemon import run_daemon
+
+        run_daemon(args.socket or default_socket_path())
+
+    parser_daemon.set_defaults(func=run_daemon_command)
+
+    args = parser.parse_args(argv)
+    # Checked after parsing, so global options before the command don't hide it
+    if args.command in excluded_commands:
+        parser.error(f"{args.command} can't be run here")
     args.func(args)
 
 
@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+
+from .models import *
+
+
+__all__ = ["RuleAnalysis", "analyze_rules"]
+
+
+@dataclass
+class RuleAnalysis:
+    # Cell types which can ever appear on the board, starting from a single SEED
+    reachable_types: set[CellType]
+
+    # Indices (in priority order) of rules which can ever fire
+    live_rules: list[int]
+
+    # Indices of rules which can never fire because an earlier rule always
+    # fires first on the same cells
+    shadowed_rules: list[int]
+
+    # Indices of rules whose target or neighbor type can never appear
+    unreachable_rules: list[int]
+
+    def unreachable_target_types(self, level: Level) -> set[CellType]:
+        return {
+            t
+            for a in level.target_state.cell_types
+            for t in a
+            if t.is_living() and t not in self.reachable_types
+        }
+
+    def can_solve(self, level: Level) -> bool:
+        return not self.unreachable_target_types(level)
+
+
+def _always_fires(rule: Rule) -> bool:
+    # DIVIDE and FUSE can be blocked by the board; IGNORE never does anything
+    return rule.reaction in {Reaction.SPECIALIZE, Reaction.DIE}
+
+
+def _condition_contains(outer: Rule, inner: Rule) -> bool:
+    """Whether every cell satisfying inner's neighbor condition satisfies outer's"""
+    if outer.neighbor_type == CellType.IGNORE:
+        return True
+    if inner.neighbor_type == CellType.IGNORE:
+        return False
+    if outer.neighbor_dir != inner.neighbor_dir:
+        return False
+    if outer.neighbor_type == CellType.ANY:
+        return inner.neighbor_type != CellType.NONE
+    return outer.neighbor_type == inner.neighbor_type
+
+
+def analyze_rules(rules: list[Rule]) -> RuleAnalysis:
+    shadowed_rules = []
+    candidates = []
+    for i, rule in enumerate(rules):
+        if rule.target_type == CellType.IGNORE or rule.reaction == Reaction.IGNORE:
+            # Empty rules never fire, and never block later rules
+            continue
+        if any(
+            rules[j].target_type == rule.target_type
+            and _always_fires(rules[j])
+            and _condition_contains(rules[j], rule)
+            for j in candidates
+        ):
+            shadowed_rules.append(i)
+            continue
+        candidates.append(i)
+
+    def can_fire(rule: Rule) -> bool:
+        if rule.target_type not in reachable_types:
+            return False
+        # Conservatively assume METAL, NONE and ANY neighbors can always occur
+        return (
+            not rule.neighbor_type.is_living()
+            or rule.neighbor_type in reachable_types
+        )
+
+    reachable_types = {CellType.SEED}
+    changed = True
+    while changed:
+        changed = False
+        for i in candidates:
+            rule = rules[i]
+            if (
+                rule.reaction == Reaction.SPECIALIZE
+                and rule.spec_type not in reachable_types
+                and can_fire(rule)
+            ):
+                assert rule.spec_type is not None
+                reachable_types.add(rule.spec_type)
+                changed = True
+
+    live_rules = [i for i in candidates if can_fire(rules[i])]
+    unreachable_rules = [i for i in candidates if not can_fire(rules[i])]
+
+    return RuleAnalysis(
+        reachable_types=reachable_types,
+        live_rules=live_rules,
+        shadowed_rules=shadowed_rules,
+        unreachable_rules=unreachable_rules,
+    )
@@ -0,0 +1,244 @@
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+
+from .models import *
+
+
+__all__ = ["MetricBounds", "metric_bounds", "theoretical_min_waste", "SPEC_SOURCES"]
+
+
+@dataclass(frozen=True)
+class MetricBounds:
+    """Lower bounds on the metrics of any correct solution to a level"""
+
+    num_rules: int
+    num_frames: int
+    num_waste: int
+
+    def proven_optimal(self, metrics: Metrics) -> list[str]:
+        """Names of the metrics of a correct solution which meet their bound"""
+        if not metrics.is_correct:
+            return []
+        return [
+            name
+            for name in ("num_rules", "num_frames", "num_waste")
+            if getattr(metrics, name) <= getattr(self, name)
+        ]
+
+
+# Number of SPECIALIZE steps from SEED to each living type
+_SPEC_DEPTHS = {
+    CellType.SEED: 0,
+    CellType.FLESH: 1,
+    CellType.BONE: 1,
+    CellType.SKIN: 1,
+    CellType.FLESH_MUSCLE: 2,
+    CellType.FLESH_HEART: 2,
+    CellType.FLESH_FAT: 2,
+    CellType.BONE_SPINE: 2,
+    CellType.SKIN_HAIR: 2,
+    CellType.SKIN_EYE: 2,
+}
+
+# The type each specialized type is specialized from
+SPEC_SOURCES = {
+    CellType.FLESH: CellType.SEED,
+    CellType.BONE: CellType.SEED,
+    CellType.SKIN: CellType.SEED,
+    CellType.FLESH_MUSCLE: CellType.FLESH,
+    CellType.FLESH_HEART: CellType.FLESH,
+    CellType.FLESH_FAT: CellType.FLESH,
+    CellType.BONE_SPINE: CellType.BONE,
+    CellType.SKIN_HAIR: CellType.SKIN,
+    CellType.SKIN_EYE: CellType.SKIN,
+}
+
+
+def _neighbors(loc: Coords, width: int, height: int) -> list[Coords]:
+    return [
+        loc + d.delta() for d in Direction if (loc + d.delta()).in_bounds(width, height)
+    ]
+
+
+def _components(target: State) -> list[list[Coords]]:
+    """Connected components of the target's living cells"""
+    width, height = target.width, target.height
+    connected: dict[Coords, list[Coords]] = {
+        Coords(x, y): []
+        for x in range(width)
+        for y in range(height)
+        if target.cell_types[x][y].is_living()
+    }
+    for x in range(width - 1):
+        for y in range(height):
+            if target.horz_connected[x][y]:
+                connected[Coords(x, y)].append(Coords(x + 1, y))
+                connected[Coords(x + 1, y)].append(Coords(x, y))
+    for x in range(width):
+        for y in range(height - 1):
+            if target.vert_connected[x][y]:
+                connected[Coords(x, y)].append(Coords(x, y + 1))
+                connected[Coords(x, y + 1)].append(Coords(x, y))
+
+    components = []
+    seen: set[Coords] = set()
+    for loc in connected:
+        if loc in seen:
+            continue
+        component = [loc]
+        seen.add(loc)
+        for cur in component:
+            for nxt in connected[cur]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    component.append(nxt)
+        components.append(component)
+    return components
+
+
+@lru_cache(maxsize=None)
+def _theoretical_min_waste(width: int, height: int, packed_target: int) -> int:
+    target = State.unpack(packed_target, width, height)
+    components = _components(target)
+    if len(components) < 2:
+        return 0
+
+    component_of = {
+        loc: i for i, component in enumerate(components) for loc in component
+    }
+
+    # The components a waste cell at each non-metal cell would be in or next to
+    covers = set()
+    for x in range(width):
+        for y in range(height):
+            if target.cell_types[x][y] == CellType.METAL:
+                continue
+            loc = Coords(x, y)
+            mask = 0
+            for n_loc in [loc] + _neighbors(loc, width, height):
+                if n_loc in component_of:
+                    mask |= 1 << component_of[n_loc]
+            if mask:
+                covers.add(mask)
+
+    # Breadth-first search over the sets of covered components: the first layer
+    # covering all of them gives the minimum number of waste cells. Every
+    # component covers itself, so this terminates.
+    full = (1 << len(components)) - 1
+    seen = {0}
+    layer = {0}
+    num_waste = 0
+    while full not in layer:
+        layer = {mask | cover for mask in layer for cover in covers} - seen
+        seen |= layer
+        num_waste += 1
+    return num_waste
+
+
+def theoretical_min_waste(target: State) -> int:
+    """Minimum number of waste cells for any solution producing target
+
+    Cells only separate by dying, so with at least 2 connected components
+    there is a waste cell in or next to each of them. This is the size of the
+    smallest set of non-metal cells covering every component that way.
+    """
+    return _theoretical_min_waste(target.width, target.height, target.pack())
+
+
+def _rules_bound(target: State, num_components: int) -> int:
+    living = [t for a in target.cell_types for t in a if t.is_living()]
+
+    # Every specialized type on the board, and every type it was specialized
+    # from, was produced by a SPECIALIZE rule with that spec_type
+    spec_types = set()
+    for t in living:
+        while t != CellType.SEED:
+            spec_types.add(t)
+            t = SPEC_SOURCES[t]
+
+    # Connections are only made by DIVIDE and FUSE rules, each in one direction.
+    # DIVIDE alone only ever makes forests, so cycles need a FUSE rule as well.
+    num_connections = sum(map(sum, target.horz_connected)) + sum(
+        map(sum, target.vert_connected)
+    )
+    orientations = int(any(map(any, target.horz_connected))) + int(
+        any(map(any, target.vert_connected))
+    )
+    has_cycle = num_connections > len(living) - num_components
+    connection_rules = max(
+        orientations, 1 if len(living) > 1 else 0, 2 if has_cycle else 0
+    )
+
+    # Divisions always connect, so separate components (or no cells at all)
+    # mean cells had to die
+    needs_die = num_components != 1
+
+    return len(spec_types) + connection_rules + needs_die
+
+
+def _frames_bound(target: State) -> int:
+    width, height = target.width, target.height
+    living = [
+        Coords(x, y)
+        for x in range(width)
+        for y in range(height)
+        if target.cell_types[x][y].is_living()
+    ]
+    if not living:
+        # The seed has to die
+        return 2
+
+    # Every cell is at the end of a chain of divisions from the start, and its
+    # type took one more step per specialization along that chain. Metal placed
+    # by the solution can only make the chains longer.
+    open_cells = [
+        Coords(x, y)
+        for x in range(width)
+        for y in range(height)
+        if target.cell_types[x][y] != CellType.METAL
+    ]
+    best = None
+    for start in open_cells:
+        dist = {start: 0}
+        queue = deque([start])
+        while queue:
+            cur = queue.popleft()
+            for nxt in _neighbors(cur, width, height):
+                if nxt in dist or target.cell_types[nxt.x][nxt.y] == CellType.METAL:
+                    continue
+                dist[nxt] = dist[cur] + 1
+                queue.append(nxt)
+        if any(loc not in dist for loc in living):
+            continue
+        steps = max(
+            dist[loc] + _SPEC_DEPTHS[target.cell_types[loc.x][loc.y]]
+            for loc in living
+        )
+        best = steps if best is None else min(best, steps)
+
+    assert best is not None
+    return 1 + best
+
+
+@lru_cache(maxsize=None)
+def _metric_bounds(width: int, height: int, packed_target: int) -> MetricBounds:
+    target = State.unpack(packed_target, width, height)
+    num_components = len(_components(target))
+    return MetricBounds(
+        num_rules=_rules_bound(target, num_components),
+        num_frames=_frames_bound(target),
+        # With no cells at all, at least the seed died
+        num_waste=(
+            1 if num_components == 0 else theoretical_min_waste(target)
+        ),
+    )
+
+
+def metric_bounds(level: Level) -> MetricBounds:
+    """Lower bounds on the metrics of correct solutions, from the target alone
+
+    Cached by target state.
+    """
+    target = level.target_state
+    return _metric_bounds(target.width, target.height, target.pack())
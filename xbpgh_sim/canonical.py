@@ -0,0 +1,115 @@
+import hashlib
+
+from .models import *
+from .analysis import analyze_rules
+from .savefile import encode_solution
+
+
+__all__ = ["canonicalize_solution", "solution_fingerprint"]
+
+
+def _empty_rule() -> Rule:
+    return Rule(CellType.IGNORE, CellType.IGNORE, Direction.RIGHT, Reaction.IGNORE)
+
+
+def _normalize_rule(rule: Rule) -> Rule:
+    return Rule(
+        target_type=rule.target_type,
+        neighbor_type=rule.neighbor_type,
+        # The direction of an unconditional rule is never looked at
+        neighbor_dir=(
+            rule.neighbor_dir
+            if rule.neighbor_type != CellType.IGNORE
+            else Direction.RIGHT
+        ),
+        reaction=rule.reaction,
+        divide_dir=rule.divide_dir,
+        fuse_dir=rule.fuse_dir,
+        spec_type=rule.spec_type,
+    )
+
+
+def _rule_key(rule: Rule) -> tuple[int, ...]:
+    return (
+        rule.target_type.value,
+        rule.neighbor_type.value,
+        rule.neighbor_dir.value,
+        rule.reaction.value,
+        rule.divide_dir.value if rule.divide_dir is not None else 0,
+        rule.fuse_dir.value if rule.fuse_dir is not None else 0,
+        rule.spec_type.value if rule.spec_type is not None else 0,
+    )
+
+
+def _conditions_overlap(a: Rule, b: Rule) -> bool:
+    """Whether some cell can satisfy the neighbor conditions of both rules"""
+    if a.neighbor_type == CellType.IGNORE or b.neighbor_type == CellType.IGNORE:
+        return True
+    if a.neighbor_dir != b.neighbor_dir:
+        return True
+    if a.neighbor_type == b.neighbor_type:
+        return True
+    if a.neighbor_type == CellType.ANY:
+        return b.neighbor_type != CellType.NONE
+    if b.neighbor_type == CellType.ANY:
+        return a.neighbor_type != CellType.NONE
+    return False
+
+
+def _depends(a: Rule, b: Rule) -> bool:
+    """Whether the relative priority of a and b can matter"""
+    # A cell only ever consults the rules targeting its own type
+    return a.target_type == b.target_type and _conditions_overlap(a, b)
+
+
+def canonicalize_solution(solution: Solution) -> Solution:
+    """Maps a solution to a normal form with identical simulation behavior
+
+    Rules which can never fire are dropped, fields which are never read are
+    normalized, and rules are reordered wherever their relative priority can't
+    matter. Note that dropping rules changes num_rules and
+    num_rules_conditional; solution_fingerprint accounts for this.
+    """
+    rules = [
+        _normalize_rule(solution.rules[i])
+        for i in analyze_rules(solution.rules).live_rules
+    ]
+
+    # Lexicographically smallest ordering which keeps every pair of dependent
+    # rules in its original priority order
+    ordered: list[Rule] = []
+    remaining = list(range(len(rules)))
+    while remaining:
+        best = min(
+            (
+                i
+                for i in remaining
+                if not any(j < i and _depends(rules[j], rules[i]) for j in remaining)
+            ),
+            key=lambda i: _rule_key(rules[i]),
+        )
+        ordered.append(rules[best])
+        remaining.remove(best)
+
+    ordered += [_empty_rule() for _ in range(len(solution.rules) - len(ordered))]
+
+    return Solution(
+        rules=ordered,
+        start_pos=solution.start_pos,
+        metal_coords=sorted(solution.metal_coords),
+    )
+
+
+def solution_fingerprint(solution: Solution) -> str:
+    """Stable hash such that solutions with equal fingerprints have identical
+    simulations and metrics on every level"""
+    num_rules = sum(r.target_type != CellType.IGNORE for r in solution.rules)
+    num_rules_conditional = sum(
+        r.neighbor_type != CellType.IGNORE for r in solution.rules
+    )
+
+    h = hashlib.sha256()
+    h.update(encode_solution(canonicalize_solution(solution)))
+    h.update(num_rules.to_bytes(4, "little"))
+    h.update(num_rules_conditional.to_bytes(4, "little"))
+    return h.hexdigest()
@@ -0,0 +1,70 @@
+import os
+import pickle
+import struct
+import time
+import zlib
+from typing import Any, Optional
+
+
+__all__ = ["Checkpoint"]
+
+
+# A checkpoint file is a header followed by the zlib compressed pickle of the
+# job's state. Only load checkpoints you wrote yourself.
+_MAGIC = b"XBPGHCKP"
+_VERSION = 1
+# magic, version, kind
+_HEADER = struct.Struct("<8sI16s")
+
+
+class Checkpoint:
+    """Saves the progress of a long-running job, so it can be resumed
+
+    kind names the job, so that a checkpoint of one job isn't resumed by
+    another. Saves replace the file atomically, so an interrupted save leaves
+    the previous checkpoint intact.
+    """
+
+    def __init__(self, path: str, kind: str, interval: float = 10.0):
+        self.path = path
+        self.kind = kind
+        # Minimum number of seconds between saves, see due
+        self.interval = interval
+        self.last_save = time.monotonic()
+
+    def due(self) -> bool:
+        """Whether interval seconds have passed since the last save"""
+        return time.monotonic() - self.last_save >= self.interval
+
+    def save(self, state: Any):
+        data = zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL), 1)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, self.kind.encode()))
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        self.last_save = time.monotonic()
+
+    def load(self) -> Optional[Any]:
+        """The saved state, or None if there is no checkpoint"""
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(_HEADER.size)
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(header) != _HEADER.size:
+            raise ValueError(f"{self.path} is not a checkpoint")
+        magic, version, kind = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{self.path} is not a version {_VERSION} checkpoint")
+        if kind.rstrip(b"\0").decode() != self.kind:
+            raise ValueError(f"{self.path} is not a {self.kind} checkpoint")
+        return pickle.loads(zlib.decompress(data))
+
+    def remove(self):
+        """Removes the checkpoint once the job is done"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,65 @@
+"""Thin client for the CLI daemon (python -m xbpgh_sim daemon)
+
+Only uses the standard library and doesn't import xbpgh_sim, so it starts
+quickly when run directly:
+
+    python path/to/xbpgh_sim/client.py validate_all --json save.dat
+
+Arguments are the same as for python -m xbpgh_sim. If no daemon is listening,
+the command is run in-process instead.
+"""
+# Keep imports minimal: they dominate the client's run time
+import marshal
+import os
+import socket
+import sys
+
+
+def default_socket_path() -> str:
+    return os.environ.get("XBPGH_SIM_SOCKET") or os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp",
+        f"xbpgh_sim-{os.getuid()}.sock",
+    )
+
+
+def recv_all(sock: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = sock.recv(1 << 16)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+# Commands which read stdin without a "-" argument
+_STDIN_COMMANDS = {"validate_stream"}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(default_socket_path())
+    except OSError:
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        os.environ["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [package_dir, os.environ.get("PYTHONPATH")])
+        )
+        os.execv(sys.executable, [sys.executable, "-m", "xbpgh_sim"] + argv)
+
+    with sock:
+        # Save files can be read from stdin with "-"
+        reads_stdin = "-" in argv or not _STDIN_COMMANDS.isdisjoint(argv)
+        stdin = sys.stdin.read() if reads_stdin else None
+        sock.sendall(marshal.dumps(dict(argv=argv, cwd=os.getcwd(), stdin=stdin)))
+        sock.shutdown(socket.SHUT_WR)
+        response = marshal.loads(recv_all(sock))
+
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    sys.exit(response["exit_code"])
+
+
+if __name__ == "__main__":
+    main()
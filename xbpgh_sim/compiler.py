@@ -0,0 +1,208 @@
+from collections.abc import Sequence
+from functools import lru_cache
+from typing import Callable
+
+from .models import *
+from .models import _rule_fields
+from .analysis import analyze_rules
+
+
+__all__ = ["StepFunction", "rules_source", "compile_rules"]
+
+
+# Takes the previous state (with live_cells) and returns the same StepResult as
+# simulate_step(prv_state, rules)
+StepFunction = Callable[[State], StepResult]
+
+
+def _in_bounds(d: Direction, width: int, height: int) -> str:
+    """Bounds check for the neighbor of (x, y) in direction d"""
+    return {
+        Direction.RIGHT: f"x < {width - 1}",
+        Direction.UP: f"y < {height - 1}",
+        Direction.LEFT: "x > 0",
+        Direction.DOWN: "y > 0",
+    }[d]
+
+
+def _offset(v: str, d: int) -> str:
+    return v if d == 0 else f"{v} + {d}" if d > 0 else f"{v} - {-d}"
+
+
+def _index(d: Direction) -> str:
+    """Grid index of the neighbor of (x, y) in direction d"""
+    delta = d.delta()
+    return f"[{_offset('x', delta.x)}][{_offset('y', delta.y)}]"
+
+
+def _cell(grid: str, d: Direction) -> str:
+    return grid + _index(d)
+
+
+def _connection(d: Direction) -> str:
+    """The connection between (x, y) and its neighbor in direction d"""
+    delta = d.delta()
+    if delta.x != 0:
+        return f"horz[{'x' if delta.x > 0 else 'x - 1'}][y]"
+    return f"vert[x][{'y' if delta.y > 0 else 'y - 1'}]"
+
+
+def _condition(rule: Rule, width: int, height: int) -> str:
+    if rule.neighbor_type == CellType.IGNORE:
+        return ""
+    in_bounds = _in_bounds(rule.neighbor_dir, width, height)
+    n_type = _cell("prv_types", rule.neighbor_dir)
+    if rule.neighbor_type == CellType.NONE:
+        # Out of bounds neighbors count as NONE
+        return f"not {in_bounds} or {n_type} is NONE"
+    if rule.neighbor_type == CellType.ANY:
+        return f"{in_bounds} and {n_type} is not NONE"
+    return f"{in_bounds} and {n_type} is {rule.neighbor_type.name}"
+
+
+def _rule_lines(rule_num: int, rule: Rule, width: int, height: int) -> list[str]:
+    """Statements applying the rule to the cell at (x, y) if it fires"""
+    success = [f"applied[x][y] = {rule_num}", "did_change = True", "continue"]
+
+    if rule.reaction == Reaction.DIVIDE:
+        assert rule.divide_dir is not None
+        n_type = _cell("types", rule.divide_dir)
+        in_bounds = _in_bounds(rule.divide_dir, width, height)
+        fires = f"{in_bounds} and {n_type} is NONE"
+        body = [
+            f"{n_type} = {rule.target_type.name}",
+            f"{_connection(rule.divide_dir)} = True",
+            f"live_cells.append(COORDS{_index(rule.divide_dir)})",
+        ]
+    elif rule.reaction == Reaction.FUSE:
+        assert rule.fuse_dir is not None
+        in_bounds = _in_bounds(rule.fuse_dir, width, height)
+        connection = _connection(rule.fuse_dir)
+        fires = (
+            f"{in_bounds} and {_cell('types', rule.fuse_dir)} in LIVING"
+            f" and not {connection}"
+        )
+        body = [f"{connection} = True"]
+    elif rule.reaction == Reaction.DIE:
+        fires = ""
+        body = ["dead.append(loc)"]
+    elif rule.reaction == Reaction.SPECIALIZE:
+        assert rule.spec_type is not None
+        fires = ""
+        body = [f"types[x][y] = {rule.spec_type.name}"]
+    else:
+        raise ValueError(f"Invalid reaction {rule.reaction}")
+
+    condition = " and ".join(
+        f"({c})" if " or " in c else c
+        for c in [_condition(rule, width, height), fires]
+        if c
+    )
+    if not condition:
+        return body + success
+    return [f"if {condition}:"] + ["    " + line for line in body + success]
+
+
+def rules_source(rules: tuple[Rule, ...], width: int = 4, height: int = 5) -> str:
+    """Python source of a step function specialized to a ruleset and board size
+
+    Only live rules are emitted, grouped by target type in priority order, with
+    every direction, bound and type resolved to a constant.
+    """
+    by_type: dict[CellType, list[int]] = {}
+    for rule_num in analyze_rules(list(rules)).live_rules:
+        by_type.setdefault(rules[rule_num].target_type, []).append(rule_num)
+
+    dispatch = []
+    for target_type, rule_nums in by_type.items():
+        dispatch.append(
+            f"{'if' if not dispatch else 'elif'} t is {target_type.name}:"
+        )
+        for rule_num in rule_nums:
+            dispatch += [
+                "    " + line
+                for line in _rule_lines(rule_num, rules[rule_num], width, height)
+            ]
+
+    lines = [
+        "def step(prv_state):",
+        "    prv_types = prv_state.cell_types",
+        "    types = [a[:] for a in prv_types]",
+        "    horz = [a[:] for a in prv_state.horz_connected]",
+        "    vert = [a[:] for a in prv_state.vert_connected]",
+        "    live_cells = prv_state.live_cells[:]",
+        f"    applied = [[None] * {height} for _ in range({width})]",
+        "    dead = []",
+        "    did_change = False",
+    ]
+    if dispatch:
+        lines += [
+            "    for loc in prv_state.live_cells:",
+            "        x = loc.x",
+            "        y = loc.y",
+            "        t = prv_types[x][y]",
+        ]
+        lines += ["        " + line for line in dispatch]
+    lines += [
+        "    for loc in dead:",
+        "        x = loc.x",
+        "        y = loc.y",
+        "        types[x][y] = NONE",
+        "        if x > 0:",
+        "            horz[x - 1][y] = False",
+        f"        if x < {width - 1}:",
+        "            horz[x][y] = False",
+        "        if y > 0:",
+        "            vert[x][y - 1] = False",
+        f"        if y < {height - 1}:",
+        "            vert[x][y] = False",
+        "    if dead:",
+        "        live_cells = [loc for loc in live_cells if loc not in dead]",
+        "    state = new_state(types, horz, vert, live_cells)",
+        "    return StepResult(state, applied, len(dead), did_change)",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _new_state(cell_types, horz_connected, vert_connected, live_cells) -> State:
+    # Skips the checks in State.__post_init__
+    state = object.__new__(State)
+    state.cell_types = cell_types
+    state.horz_connected = horz_connected
+    state.vert_connected = vert_connected
+    state.live_cells = live_cells
+    return state
+
+
+_GLOBALS = {
+    **{t.name: t for t in CellType},
+    "LIVING": frozenset(t for t in CellType if t.is_living()),
+    "StepResult": StepResult,
+    "new_state": _new_state,
+}
+
+
+def compile_rules(
+    rules: Sequence[Rule], width: int = 4, height: int = 5
+) -> StepFunction:
+    """Compiles rules_source(rules, width, height), caching by ruleset
+
+    The cache is keyed on the rules themselves rather than a canonical form,
+    since rules_applied records the original rule indices.
+    """
+    return _compile_rules(tuple(map(_rule_fields, rules)), width, height)
+
+
+@lru_cache(maxsize=4096)
+def _compile_rules(rule_fields: tuple, width: int, height: int) -> StepFunction:
+    namespace = dict(
+        _GLOBALS,
+        COORDS=[[Coords(x, y) for y in range(height)] for x in range(width)],
+    )
+    source = rules_source(tuple(Rule(*fields) for fields in rule_fields), width, height)
+    exec(compile(source, "<xbpgh_sim compiled rules>", "exec"), namespace)
+    return namespace["step"]
+
+
+# Like an lru_cache wrapped function, for benchmarks
+compile_rules.cache_clear = _compile_rules.cache_clear
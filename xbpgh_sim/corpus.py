@@ -0,0 +1,180 @@
+import hashlib
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from .models import *
+from .savefile import parse_solution
+
+
+__all__ = ["CorpusRecord", "build_corpus_index", "CorpusStore"]
+
+
+# A corpus dump is a text file of lines of the form
+#   [<player_id> ]Toronto.Solution.<level_id>.<slot> = <save_string>
+# Other lines are ignored.
+#
+# The sidecar index (by default <dump>.idx) is a header followed by entries
+# sorted by (level_id, slot, player hash), so lookups are binary searches over
+# the mmapped index and only the matching lines of the dump are read.
+_INDEX_MAGIC = b"XBPGHIDX"
+_INDEX_VERSION = 1
+# magic, version, number of entries, size of the dump when indexed
+_HEADER = struct.Struct("<8sIQQ")
+# level_id, slot, player hash, line offset, line length
+_ENTRY = struct.Struct("<iiQQI")
+
+
+@dataclass
+class CorpusRecord:
+    player: str
+    level_id: int
+    slot: int
+    save_string: str
+
+    def solution(self) -> Solution:
+        return parse_solution(self.save_string)
+
+
+def _player_hash(player: str) -> int:
+    digest = hashlib.blake2b(player.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _parse_line(line: bytes) -> Optional[CorpusRecord]:
+    head, sep, val = line.partition(b" = ")
+    if not sep:
+        return None
+    fields = head.split()
+    if len(fields) == 1:
+        player, key = b"", fields[0]
+    elif len(fields) == 2:
+        player, key = fields
+    else:
+        return None
+    parts = key.split(b".")
+    if len(parts) != 4 or parts[0] != b"Toronto" or parts[1] != b"Solution":
+        return None
+    if not (parts[2].isdigit() and parts[3].isdigit()):
+        return None
+    return CorpusRecord(
+        player=player.decode(),
+        level_id=int(parts[2]),
+        slot=int(parts[3]),
+        save_string=val.strip().decode(),
+    )
+
+
+def build_corpus_index(dump_path: str, index_path: Optional[str] = None) -> int:
+    """Writes the sidecar index of a corpus dump, returning the number of entries"""
+    index_path = index_path or dump_path + ".idx"
+
+    entries = []
+    offset = 0
+    with open(dump_path, "rb") as f:
+        for line in f:
+            record = _parse_line(line)
+            if record is not None:
+                entries.append(
+                    (
+                        record.level_id,
+                        record.slot,
+                        _player_hash(record.player),
+                        offset,
+                        len(line),
+                    )
+                )
+            offset += len(line)
+    entries.sort()
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, len(entries), offset))
+        for entry in entries:
+            f.write(_ENTRY.pack(*entry))
+    os.replace(tmp_path, index_path)
+    return len(entries)
+
+
+def _map_file(path: str) -> Union[mmap.mmap, bytes]:
+    """A read-only mmap of a file, or b"" for an empty file, which can't be
+    mmapped"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CorpusStore:
+    """Random access to the records of an indexed corpus dump"""
+
+    def __init__(self, dump_path: str, index_path: Optional[str] = None):
+        index_path = index_path or dump_path + ".idx"
+        self.dump = _map_file(dump_path)
+        self.index = _map_file(index_path)
+
+        if len(self.index) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{index_path} is not a corpus index")
+        magic, version, self.num_entries, dump_size = _HEADER.unpack_from(self.index)
+        if magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+            self.close()
+            raise ValueError(f"{index_path} is not a corpus index")
+        if dump_size != len(self.dump):
+            self.close()
+            raise ValueError(f"{index_path} is out of date, rebuild it")
+
+    def close(self):
+        for mapped in (self.dump, self.index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.num_entries
+
+    def _entry(self, i: int) -> tuple[int, int, int, int, int]:
+        return _ENTRY.unpack_from(self.index, _HEADER.size + i * _ENTRY.size)
+
+    def _lower_bound(self, key: tuple[int, ...]) -> int:
+        lo, hi = 0, self.num_entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[: len(key)] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(
+        self, level_id: int, slot: int, player: Optional[str] = None
+    ) -> list[CorpusRecord]:
+        """Records for (level_id, slot), optionally for one player, in dump order"""
+        key: tuple[int, ...] = (level_id, slot)
+        if player is not None:
+            key += (_player_hash(player),)
+
+        entries = []
+        i = self._lower_bound(key)
+        while i < self.num_entries:
+            entry = self._entry(i)
+            if entry[: len(key)] != key:
+                break
+            entries.append(entry)
+            i += 1
+
+        records = []
+        for *_, offset, length in sorted(entries, key=lambda entry: entry[3]):
+            record = _parse_line(self.dump[offset : offset + length])
+            assert record is not None
+            # Player hashes can collide
+            if player is None or record.player == player:
+                records.append(record)
+        return records
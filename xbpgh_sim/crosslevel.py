@@ -0,0 +1,84 @@
+from collections import defaultdict
+from typing import Optional
+
+from .models import *
+from .errors import MetalPositionError, StartPositionError
+from .levels import LEVELS
+from .simulator import simulate_solution
+
+
+__all__ = ["metal_mask", "LevelIndex", "solved_levels"]
+
+
+def metal_mask(level: Level) -> int:
+    """Bitmask of the metal cells of the target, in State.pack order"""
+    target = level.target_state
+    return sum(
+        1 << (target.height * x + y)
+        for x in range(target.width)
+        for y in range(target.height)
+        if target.cell_types[x][y] == CellType.METAL
+    )
+
+
+class LevelIndex:
+    """Levels grouped by metal layout, for solved_levels"""
+
+    def __init__(self, levels: list[Level]):
+        # Levels sharing a metal layout share their starting state, so every
+        # solution simulates identically on them. Whether metal can be placed is
+        # part of the key, so the levels of a group accept the same solutions.
+        self.metal_groups: dict[tuple[int, Board, bool], list[Level]] = defaultdict(
+            list
+        )
+        for level in levels:
+            key = (metal_mask(level), level.board, level.can_place_metal)
+            self.metal_groups[key].append(level)
+
+        # Keyed by the metal group key and the packed target state
+        self.targets: dict[tuple[int, Board, bool, int], list[Level]] = defaultdict(
+            list
+        )
+        for level in levels:
+            key = (
+                metal_mask(level),
+                level.board,
+                level.can_place_metal,
+                level.target_state.pack(),
+            )
+            self.targets[key].append(level)
+
+    def solved_levels(self, solution: Solution) -> list[Level]:
+        """The indexed levels correctly solved by solution"""
+        solved = []
+        for key, group in self.metal_groups.items():
+            if solution.metal_coords and not group[0].can_place_metal:
+                continue
+            try:
+                result = simulate_solution(group[0], solution)
+            except (StartPositionError, MetalPositionError):
+                # Start position is on metal for this layout, or off its board
+                continue
+            solved += self.targets.get((*key, result.final_state.pack()), [])
+
+        return sorted(solved, key=lambda level: level.level_index)
+
+
+_LEVELS_INDEX: Optional[LevelIndex] = None
+
+
+def solved_levels(
+    solution: Solution, levels: Optional[list[Level]] = None
+) -> list[Level]:
+    """Returns the levels (by default, all of LEVELS) correctly solved by solution
+
+    Each distinct metal layout is only simulated once.
+    """
+    global _LEVELS_INDEX
+    if levels is None:
+        if _LEVELS_INDEX is None:
+            _LEVELS_INDEX = LevelIndex(LEVELS)
+        index = _LEVELS_INDEX
+    else:
+        index = LevelIndex(levels)
+    return index.solved_levels(solution)
@@ -0,0 +1,80 @@
+import contextlib
+import io
+import marshal
+import os
+import socketserver
+import sys
+import traceback
+
+from .client import recv_all
+
+
+__all__ = ["run_daemon"]
+
+
+def run_command(argv: list[str], cwd: str, stdin: str) -> dict:
+    """Runs python -m xbpgh_sim <argv> in this process, capturing its output"""
+    from .__main__ import main
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    exit_code = 0
+    prv_cwd = os.getcwd()
+    prv_stdin = sys.stdin
+    try:
+        os.chdir(cwd)
+        sys.stdin = io.StringIO(stdin)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                main(argv, excluded_commands=_EXCLUDED_COMMANDS)
+            except SystemExit as e:
+                if isinstance(e.code, int) or e.code is None:
+                    exit_code = e.code or 0
+                else:
+                    print(e.code, file=sys.stderr)
+                    exit_code = 1
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+    finally:
+        sys.stdin = prv_stdin
+        os.chdir(prv_cwd)
+
+    return dict(stdout=stdout.getvalue(), stderr=stderr.getvalue(), exit_code=exit_code)
+
+
+# Commands which would take over the daemon
+_EXCLUDED_COMMANDS = frozenset({"serve", "daemon"})
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        request = marshal.loads(recv_all(self.request))
+        response = run_command(
+            request["argv"], request["cwd"], request["stdin"] or ""
+        )
+        self.request.sendall(marshal.dumps(response))
+
+
+def run_daemon(socket_path: str):
+    """Serves CLI commands over a Unix socket, one at a time"""
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(socket_path)
+
+    # Import everything commands need up front
+    from . import __main__  # noqa: F401
+
+    # Only the owner may run commands. The socket is created with these
+    # permissions, rather than changed after bind, so there is no window in
+    # which others can connect.
+    prv_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, _Handler)
+    finally:
+        os.umask(prv_umask)
+    with server:
+        print(f"Listening on {socket_path}", flush=True)
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
@@ -0,0 +1,100 @@
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional, TextIO
+
+
+__all__ = [
+    "SolutionError",
+    "SaveVersionError",
+    "RuleError",
+    "StartPositionError",
+    "MetalPositionError",
+    "UnknownLevelError",
+    "ERROR_CATEGORIES",
+    "error_category",
+    "ErrorLog",
+]
+
+
+class SolutionError(ValueError):
+    """A save string which doesn't decode to a valid solution"""
+
+    category = "decode"
+
+
+class SaveVersionError(SolutionError):
+    category = "version"
+
+
+class RuleError(SolutionError):
+    category = "rule"
+
+
+class StartPositionError(SolutionError):
+    """A start position outside the board, or on a cell which isn't empty"""
+
+    category = "start_position"
+
+
+class MetalPositionError(SolutionError):
+    """Metal placed on a level which doesn't allow it"""
+
+    category = "metal_position"
+
+
+class UnknownLevelError(SolutionError):
+    """A solution for a level ID which isn't among the levels validated"""
+
+    category = "unknown_level"
+
+
+# Categories of error_category, in summary order
+ERROR_CATEGORIES = [
+    "decode",
+    "version",
+    "rule",
+    "start_position",
+    "metal_position",
+    "unknown_level",
+    "other",
+]
+
+
+def error_category(e: BaseException) -> str:
+    if isinstance(e, SolutionError):
+        return e.category
+    return "other"
+
+
+@dataclass
+class ErrorLog:
+    """Errors of records skipped in bulk mode, counted by category
+
+    Each error is also written to stream, if given, as a line of JSON with its
+    category, the error and the context it was recorded with.
+    """
+
+    stream: Optional[TextIO] = None
+    counts: Counter = field(default_factory=Counter)
+
+    def record(self, e: BaseException, **context) -> dict:
+        entry = dict(**context, category=error_category(e), error=repr(e))
+        self.counts[entry["category"]] += 1
+        if self.stream is not None:
+            self.stream.write(json.dumps(entry) + "\n")
+            self.stream.flush()
+        return entry
+
+    @property
+    def num_errors(self) -> int:
+        return sum(self.counts.values())
+
+    def summary(self) -> str:
+        """e.g. "3 errors: decode 2, rule 1" """
+        counts = ", ".join(
+            f"{category} {self.counts[category]}"
+            for category in ERROR_CATEGORIES
+            if self.counts[category]
+        )
+        return f"{self.num_errors} errors" + (f": {counts}" if counts else "")
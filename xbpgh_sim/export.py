@@ -0,0 +1,164 @@
+import ast
+import dataclasses
+import os
+import struct
+from typing import Iterable, Iterator, Optional
+
+from .models import *
+from .validation import LEVELS_BY_ID, solution_hash
+
+
+__all__ = ["RESULT_FIELDS", "ResultsWriter", "load_results", "read_exported_results"]
+
+
+# Columns of exported results as (name, NumPy type string), i.e. the descr of a
+# packed NumPy structured dtype
+RESULT_FIELDS = [
+    ("level_id", "<i4"),
+    ("slot", "<i4"),
+    ("solution_hash", "<u8"),
+] + [
+    (field.name, "|b1" if field.type == "bool" else "<i4")
+    for field in dataclasses.fields(Metrics)
+]
+
+_ROW = struct.Struct(
+    "<iiQ"
+    + "".join(
+        "?" if field.type == "bool" else "i" for field in dataclasses.fields(Metrics)
+    )
+)
+
+# The .npy header is written with room for any row count, so appending only
+# rewrites it in place. See numpy.lib.format for the layout.
+_MAGIC = b"\x93NUMPY\x01\x00"
+_HEADER_SIZE = 64 * -(-(len(_MAGIC) + 2 + 80 + len(repr(RESULT_FIELDS))) // 64)
+
+
+def _header(num_rows: int) -> bytes:
+    header = repr(
+        {"descr": RESULT_FIELDS, "fortran_order": False, "shape": (num_rows,)}
+    )
+    header = header.ljust(_HEADER_SIZE - len(_MAGIC) - 2 - 1) + "\n"
+    return _MAGIC + struct.pack("<H", len(header)) + header.encode("latin-1")
+
+
+def _read_num_rows(f) -> int:
+    prefix = f.read(len(_MAGIC) + 2)
+    magic, header_len = prefix[:-2], int.from_bytes(prefix[-2:], "little")
+    try:
+        header = ast.literal_eval(f.read(header_len).decode("latin-1"))
+    except (SyntaxError, ValueError):
+        header = None
+    if (
+        magic != _MAGIC
+        or len(_MAGIC) + 2 + header_len != _HEADER_SIZE
+        or not isinstance(header, dict)
+        or header.get("descr") != RESULT_FIELDS
+        or header.get("fortran_order")
+    ):
+        raise ValueError(f"{f.name} is not an exported results file")
+    (num_rows,) = header["shape"]
+    return num_rows
+
+
+class ResultsWriter:
+    """Appends validation results to a .npy file, one record per solution
+
+    The file holds a 1-d structured array with RESULT_FIELDS as columns, so
+    load_results (or numpy.load) can memory map it. Each append writes its rows
+    before updating the row count in the header, so an interrupted append
+    leaves the file as it was before the append.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.exists(path):
+            self.file = open(path, "r+b")
+            self.num_rows = _read_num_rows(self.file)
+            # Drop the rows of an interrupted append
+            self.file.truncate(_HEADER_SIZE + self.num_rows * _ROW.size)
+        else:
+            self.file = open(path, "w+b")
+            self.num_rows = 0
+            self.file.write(_header(0))
+
+    def append(
+        self, results: Iterable[tuple[int, int, Optional[str], Metrics]]
+    ) -> int:
+        """Appends (level_id, slot, save_string, metrics) rows, returning the count
+
+        Solutions without a save string get a solution_hash of 0.
+        """
+        data = bytearray()
+        for level_id, slot, save_string, metrics in results:
+            data += _ROW.pack(
+                level_id,
+                slot,
+                0 if save_string is None else solution_hash(save_string),
+                *dataclasses.astuple(metrics),
+            )
+        num_rows = len(data) // _ROW.size
+
+        self.file.seek(_HEADER_SIZE + self.num_rows * _ROW.size)
+        self.file.write(data)
+        self.file.flush()
+        self.num_rows += num_rows
+        self.file.seek(0)
+        self.file.write(_header(self.num_rows))
+        self.file.flush()
+        return num_rows
+
+    def truncate(self, num_rows: int):
+        """Drops the rows after the first num_rows, e.g. to resume from a checkpoint"""
+        assert num_rows <= self.num_rows
+        self.num_rows = num_rows
+        self.file.seek(0)
+        self.file.write(_header(num_rows))
+        self.file.truncate(_HEADER_SIZE + num_rows * _ROW.size)
+        self.file.flush()
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_exported_results(path: str) -> Iterator[dict]:
+    """Reads an exported results file as validation records, like those of
+    validate_stream, without numpy
+
+    Records have solution_hash instead of the solution, and a level_name only
+    for levels in LEVELS.
+    """
+    metric_names = [field.name for field in dataclasses.fields(Metrics)]
+    with open(path, "rb") as f:
+        num_rows = _read_num_rows(f)
+        f.seek(_HEADER_SIZE)
+        data = f.read(num_rows * _ROW.size)
+    for level_id, slot, hash_, *metrics in _ROW.iter_unpack(data):
+        level = LEVELS_BY_ID.get(level_id)
+        yield dict(
+            **(dict(level_name=level.level_name) if level is not None else {}),
+            level_id=level_id,
+            slot_id=slot,
+            solution_hash=hash_,
+            **dict(zip(metric_names, metrics)),
+        )
+
+
+def load_results(path: str, mmap: bool = True):
+    """Loads an exported results file as a NumPy structured array
+
+    Requires numpy. With mmap, the array is a read-only view of the file.
+    """
+    import numpy
+
+    return numpy.load(path, mmap_mode="r" if mmap else None)
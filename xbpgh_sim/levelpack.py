@@ -0,0 +1,208 @@
+import dataclasses
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from .models import *
+from .levels import LEVELS
+from .bounds import MetricBounds, metric_bounds
+from .crosslevel import LevelIndex
+
+
+__all__ = [
+    "LevelInfo",
+    "LevelPack",
+    "load_level_pack",
+    "dump_level_pack",
+    "merge_levels",
+]
+
+
+# A level pack is a JSON object of the form
+#   {"format": "xbpgh_sim level pack", "version": 1, "name": <str>,
+#    "levels": [<level>, ...]}
+# where each level has level_id, level_name and target, and optionally width and
+# height (default 4 x 5), num_frames (11), can_place_metal (false),
+# theoretical_min_waste (a non-negative int, computed when missing) and bounds
+# ([num_rules, num_frames, num_waste]). The target is either a packed state as a
+# hex string ("0x...", see State.pack) or a State.visualize block.
+# dump_level_pack writes packed targets along with the precomputed min waste and
+# bounds, so loading doesn't recompute them.
+_FORMAT = "xbpgh_sim level pack"
+_VERSION = 1
+
+
+@dataclass
+class LevelInfo:
+    """Static data of a level, computed once when its pack is loaded"""
+
+    level: Level
+    bounds: MetricBounds
+
+
+class LevelPack:
+    def __init__(self, name: str, infos: list[LevelInfo]):
+        self.name = name
+        self.levels = [info.level for info in infos]
+        self.by_id = {info.level.level_id: info for info in infos}
+        if len(self.by_id) != len(infos):
+            raise ValueError(f"Level pack {name} has duplicate level IDs")
+        # For solved_levels
+        self.index = LevelIndex(self.levels)
+
+    @classmethod
+    def from_levels(cls, name: str, levels: list[Level]) -> "LevelPack":
+        return cls(name, [LevelInfo(level, metric_bounds(level)) for level in levels])
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def get_level(self, name_or_id: str) -> Optional[Level]:
+        """Looks up a level by ID or (case-insensitive) name"""
+        if name_or_id.strip().isdigit() and int(name_or_id) in self.by_id:
+            return self.by_id[int(name_or_id)].level
+        for level in self.levels:
+            if level.level_name.lower() == name_or_id.strip().lower():
+                return level
+        return None
+
+    def solved_levels(self, solution: Solution) -> list[Level]:
+        """The levels of this pack correctly solved by solution, see solved_levels"""
+        return self.index.solved_levels(solution)
+
+    def metric_bounds(self, level_id: int) -> MetricBounds:
+        """The precomputed metric_bounds of a level of this pack"""
+        return self.by_id[level_id].bounds
+
+
+def _parse_level(entry: dict, level_index: int) -> LevelInfo:
+    board = Board(
+        width=int(entry.get("width", 4)),
+        height=int(entry.get("height", 5)),
+        num_frames=int(entry.get("num_frames", 11)),
+    )
+    if min(board.width, board.height, board.num_frames) < 1:
+        raise ValueError(f"Invalid board of level {entry['level_id']}: {board}")
+    target = entry["target"]
+    if not isinstance(target, str):
+        raise ValueError(f"Target of level {entry['level_id']} isn't a string")
+    if target.startswith("0x"):
+        packed_target = int(target, 16)
+        target_state = State.unpack(packed_target, board.width, board.height)
+        # Reject bits past the end of the state
+        if target_state.pack() != packed_target:
+            raise ValueError(f"Invalid packed target {target}")
+    else:
+        target_state = State.from_visualize(target.strip("\n"))
+        packed_target = target_state.pack()
+    if (target_state.width, target_state.height) != (board.width, board.height):
+        raise ValueError(f"Target of level {entry['level_id']} doesn't fit its board")
+
+    min_waste = entry.get("theoretical_min_waste")
+    # Not bool, though it's an int subclass
+    if min_waste is not None and (type(min_waste) is not int or min_waste < 0):
+        raise ValueError(
+            f"Invalid theoretical_min_waste of level {entry['level_id']}: "
+            f"{min_waste!r}"
+        )
+
+    level = Level(
+        level_id=int(entry["level_id"]),
+        level_name=str(entry["level_name"]),
+        level_index=level_index,
+        target_state=target_state,
+        theoretical_min_waste=min_waste,
+        can_place_metal=bool(entry.get("can_place_metal", False)),
+        board=board,
+    )
+    bounds = entry.get("bounds")
+    return LevelInfo(
+        level, metric_bounds(level) if bounds is None else MetricBounds(*bounds)
+    )
+
+
+# Loaded packs by path, with the (mtime, size) they were loaded at
+_PACKS: dict[str, tuple[tuple[int, int], LevelPack]] = {}
+
+
+def load_level_pack(path: str) -> LevelPack:
+    """Loads a level pack, reusing the last load of the same unchanged file
+
+    Pack levels get level_index values after the built-in levels, in pack order,
+    see merge_levels for using several packs.
+    """
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _PACKS.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("format") != _FORMAT or data.get("version") != _VERSION:
+        raise ValueError(f"{path} is not a version {_VERSION} level pack")
+    try:
+        infos = [
+            _parse_level(entry, len(LEVELS) + i)
+            for i, entry in enumerate(data["levels"])
+        ]
+    except (KeyError, TypeError, ValueError, AssertionError) as e:
+        raise ValueError(f"Invalid level in {path}: {e!r}") from None
+    pack = LevelPack(str(data.get("name", "")), infos)
+    _PACKS[path] = (key, pack)
+    return pack
+
+
+def dump_level_pack(pack: LevelPack, path: str):
+    """Writes a pack in the precompiled form, with packed targets"""
+    levels = []
+    for level in pack.levels:
+        bounds = pack.metric_bounds(level.level_id)
+        entry = dict(
+            level_id=level.level_id,
+            level_name=level.level_name,
+            target=hex(level.target_state.pack()),
+        )
+        if level.board != Board():
+            entry.update(
+                width=level.board.width,
+                height=level.board.height,
+                num_frames=level.board.num_frames,
+            )
+        if level.can_place_metal:
+            entry.update(can_place_metal=True)
+        entry.update(
+            theoretical_min_waste=level.theoretical_min_waste,
+            bounds=[bounds.num_rules, bounds.num_frames, bounds.num_waste],
+        )
+        levels.append(entry)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            dict(format=_FORMAT, version=_VERSION, name=pack.name, levels=levels), f
+        )
+    os.replace(tmp_path, path)
+
+
+def merge_levels(packs: list[LevelPack]) -> list[Level]:
+    """The built-in levels followed by the levels of each pack
+
+    Pack levels are copied with level_index values following the levels before
+    them, so indexes stay distinct across packs. Raises ValueError if any level
+    ID is used twice.
+    """
+    levels = list(LEVELS)
+    seen = {level.level_id for level in levels}
+    for pack in packs:
+        for level in pack.levels:
+            if level.level_id in seen:
+                raise ValueError(
+                    f"Level ID {level.level_id} of pack {pack.name} is already used"
+                )
+            seen.add(level.level_id)
+            if level.level_index != len(levels):
+                level = dataclasses.replace(level, level_index=len(levels))
+            levels.append(level)
+    return levels
@@ -0,0 +1,85 @@
+import json
+import sys
+from typing import Iterable, Iterator, Optional, TextIO
+
+from .levels import LEVELS
+
+
+__all__ = ["read_results", "read_result_file", "merge_results"]
+
+
+# Metrics for which lower is better among correct solutions
+BEST_METRICS = ["num_rules", "num_rules_conditional", "num_frames", "num_waste"]
+
+
+def read_results(f: TextIO) -> Iterator[dict]:
+    """Reads validate_all --json output (a JSON array) or JSON lines"""
+    for line in f:
+        if not line.strip():
+            continue
+        if line.lstrip().startswith("["):
+            yield from json.loads(line + f.read())
+            return
+        yield json.loads(line)
+
+
+def read_result_file(path: str) -> Iterator[dict]:
+    """Reads results from a JSON, JSON lines or exported .npy file (- for stdin)"""
+    if path.endswith(".npy"):
+        from .export import read_exported_results
+
+        yield from read_exported_results(path)
+    elif path == "-":
+        yield from read_results(sys.stdin)
+    else:
+        with open(path) as f:
+            yield from read_results(f)
+
+
+def merge_results(results: Iterable[dict]) -> dict:
+    """Aggregates validation results, e.g. from several shards, per level
+
+    For each level, counts solutions and correct solutions, and gives the best
+    (lowest) value of each of BEST_METRICS over the correct solutions. Errors
+    are counted by category (see error_category).
+    """
+    num_results = 0
+    num_errors = 0
+    error_categories: dict[str, int] = {}
+    levels: dict[int, dict] = {}
+    for result in results:
+        num_results += 1
+        if "error" in result:
+            num_errors += 1
+            category = result.get("category", "other")
+            error_categories[category] = error_categories.get(category, 0) + 1
+            continue
+
+        level = levels.setdefault(
+            result["level_id"],
+            dict(
+                level_name=result.get("level_name", f"Level {result['level_id']}"),
+                level_id=result["level_id"],
+                num_solutions=0,
+                num_correct=0,
+                **{f"best_{metric}": None for metric in BEST_METRICS},
+            ),
+        )
+        level["num_solutions"] += 1
+        if result["is_correct"]:
+            level["num_correct"] += 1
+            for metric in BEST_METRICS:
+                best: Optional[int] = level[f"best_{metric}"]
+                if best is None or result[metric] < best:
+                    level[f"best_{metric}"] = result[metric]
+
+    level_order = {level.level_id: level.level_index for level in LEVELS}
+    return dict(
+        num_results=num_results,
+        num_errors=num_errors,
+        error_categories=error_categories,
+        levels=sorted(
+            levels.values(),
+            key=lambda level: level_order.get(level["level_id"], len(LEVELS)),
+        ),
+    )
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+import sys
+from array import array
+from collections.abc import Sequence
 from enum import Enum, unique
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, fields
+from operator import attrgetter
+from typing import Optional, Union, overload
 
 
 __all__ = [
+    "Board",
     "Coords",
     "CellType",
     "Direction",
@@ -16,17 +21,33 @@ __all__ = [
     "Level",
     "Metrics",
     "StepResult",
+    "PackedStates",
+    "RulesAppliedTrace",
     "SimulationResult",
 ]
 
 
-@dataclass(eq=True, order=True, frozen=True)
+# Slotted dataclasses have no per-instance __dict__. Frozen slotted dataclasses
+# only unpickle correctly from Python 3.11.
+_SLOTS = dict(slots=True) if sys.version_info >= (3, 11) else {}
+
+
+@dataclass(frozen=True, **_SLOTS)
+class Board:
+    """Grid size and number of simulated frames, defaulting to the game's"""
+
+    width: int = 4
+    height: int = 5
+    num_frames: int = 11
+
+
+@dataclass(eq=True, order=True, frozen=True, **_SLOTS)
 class Coords:
     x: int
     y: int
 
-    def in_bounds(self) -> bool:
-        return 0 <= self.x < 4 and 0 <= self.y < 5
+    def in_bounds(self, width: int = 4, height: int = 5) -> bool:
+        return 0 <= self.x < width and 0 <= self.y < height
 
     def __add__(self, o: Coords) -> Coords:
         return Coords(self.x + o.x, self.y + o.y)
@@ -126,7 +147,7 @@ class Reaction(Enum):
     SPECIALIZE = 2
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class Rule:
     target_type: CellType
     neighbor_type: CellType
@@ -254,7 +275,12 @@ class Rule:
         return "\n".join("".join(t) for t in zip(g_lines, mid, h_lines))
 
 
-@dataclass
+# The fields of a rule as a tuple, to key caches by ruleset since Rules are
+# mutable and so unhashable
+_rule_fields = attrgetter(*(field.name for field in fields(Rule)))
+
+
+@dataclass(**_SLOTS)
 class Solution:
     rules: list[Rule]
     start_pos: Coords
@@ -262,41 +288,52 @@ class Solution:
     save_string: Optional[str] = None
 
 
+# Not slotted, since simulate_step deep copies a State every step and that is
+# slower for slotted dataclasses
 @dataclass
 class State:
-    # size 4 x 5
+    # size width x height (4 x 5 in the game)
     cell_types: list[list[CellType]]
 
-    # size 3 x 5
+    # size (width - 1) x height
     # horz_connected[i][j] is whether (i, j) is connected to (i+1, j)
     horz_connected: list[list[bool]]
 
-    # size 4 x 4
+    # size width x (height - 1)
     # vert_connected[i][j] is whether (i, j) is connected to (i, j+1)
     vert_connected: list[list[bool]]
 
     live_cells: Optional[list[Coords]] = None
 
+    @property
+    def width(self) -> int:
+        return len(self.cell_types)
+
+    @property
+    def height(self) -> int:
+        return len(self.cell_types[0])
+
     def check_state(self):
-        assert len(self.cell_types) == 4 and all(len(a) == 5 for a in self.cell_types)
-        assert len(self.horz_connected) == 3 and all(
-            len(a) == 5 for a in self.horz_connected
+        width, height = self.width, self.height
+        assert all(len(a) == height for a in self.cell_types)
+        assert len(self.horz_connected) == width - 1 and all(
+            len(a) == height for a in self.horz_connected
         )
-        assert len(self.vert_connected) == 4 and all(
-            len(a) == 4 for a in self.vert_connected
+        assert len(self.vert_connected) == width and all(
+            len(a) == height - 1 for a in self.vert_connected
         )
 
-        for i in range(4):
-            for j in range(5):
+        for i in range(width):
+            for j in range(height):
                 assert self.cell_types[i][j] not in {CellType.IGNORE, CellType.ANY}
 
-                if i + 1 < 4 and self.horz_connected[i][j]:
+                if i + 1 < width and self.horz_connected[i][j]:
                     assert (
                         self.cell_types[i][j].is_living()
                         and self.cell_types[i + 1][j].is_living()
                     )
 
-                if j + 1 < 5 and self.vert_connected[i][j]:
+                if j + 1 < height and self.vert_connected[i][j]:
                     assert (
                         self.cell_types[i][j].is_living()
                         and self.cell_types[i][j + 1].is_living()
@@ -305,8 +342,8 @@ class State:
         if self.live_cells is not None:
             assert set(
                 Coords(i, j)
-                for i in range(4)
-                for j in range(5)
+                for i in range(width)
+                for j in range(height)
                 if self.cell_types[i][j].is_living()
             ) == set(self.live_cells)
             assert len(self.live_cells) == len(set(self.live_cells))
@@ -314,47 +351,108 @@ class State:
     def __post_init__(self):
         self.check_state()
 
+    def pack(self) -> int:
+        """Packs the cells and connections (but not live_cells) into an int
+
+        With w = width and h = height (4 and 5 in the game), the low 4 * w * h
+        bits hold the 4-bit cell types of (x, y) at 4 * (h * x + y), followed
+        by horz_connected[x][y] at h * x + y and then vert_connected[x][y] at
+        (h - 1) * x + y.
+        """
+        width, height = self.width, self.height
+        packed = 0
+        for x in range(width):
+            for y in range(height):
+                packed |= self.cell_types[x][y].value << (4 * (height * x + y))
+        offset = 4 * width * height
+        for x in range(width - 1):
+            for y in range(height):
+                if self.horz_connected[x][y]:
+                    packed |= 1 << (offset + height * x + y)
+        offset += (width - 1) * height
+        for x in range(width):
+            for y in range(height - 1):
+                if self.vert_connected[x][y]:
+                    packed |= 1 << (offset + (height - 1) * x + y)
+        return packed
+
+    @classmethod
+    def unpack(cls, packed: int, width: int = 4, height: int = 5) -> State:
+        horz_offset = 4 * width * height
+        vert_offset = horz_offset + (width - 1) * height
+        return cls(
+            cell_types=[
+                [
+                    CellType((packed >> (4 * (height * x + y))) & 15)
+                    for y in range(height)
+                ]
+                for x in range(width)
+            ],
+            horz_connected=[
+                [
+                    bool(packed >> (horz_offset + height * x + y) & 1)
+                    for y in range(height)
+                ]
+                for x in range(width - 1)
+            ],
+            vert_connected=[
+                [
+                    bool(packed >> (vert_offset + (height - 1) * x + y) & 1)
+                    for y in range(height - 1)
+                ]
+                for x in range(width)
+            ],
+        )
+
     def visualize(self) -> str:
-        g = [[" " for _ in range(9)] for _ in range(7)]
-        for x in range(4):
-            for y in range(5):
+        width, height = self.width, self.height
+        g = [[" " for _ in range(2 * height - 1)] for _ in range(2 * width - 1)]
+        for x in range(width):
+            for y in range(height):
                 g[2 * x][2 * y] = self.cell_types[x][y].to_symbol()
 
-        for x in range(3):
-            for y in range(5):
+        for x in range(width - 1):
+            for y in range(height):
                 if self.horz_connected[x][y]:
                     g[2 * x + 1][2 * y] = "-"
 
-        for x in range(4):
-            for y in range(4):
+        for x in range(width):
+            for y in range(height - 1):
                 if self.vert_connected[x][y]:
                     g[2 * x][2 * y + 1] = "|"
 
         result = (
-            ["┌" + "─" * 7 + "┐"]
+            ["┌" + "─" * (2 * width - 1) + "┐"]
             + ["│" + "".join(s) + "│" for s in zip(*g)][::-1]
-            + ["└" + "─" * 7 + "┘"]
+            + ["└" + "─" * (2 * width - 1) + "┘"]
         )
         return "\n".join(result)
 
     @classmethod
     def from_visualize(cls, s: str) -> State:
-        """Initialize a state from a 9x7 ASCII art block, possibly with a border"""
+        """Initialize a state from an ASCII art block, possibly with a border
+
+        The block is 9x7 for the game's 4x5 board.
+        """
         g = list(zip(*reversed(s.split("\n"))))
-        if len(g) == 9 and all(len(a) == 11 for a in g):
+        if g and g[0][0] == "└":
             g = [a[1:-1] for a in g[1:-1]]
-        assert len(g) == 7 and all(len(a) == 9 for a in g)
+        assert len(g) % 2 == 1 and len(g[0]) % 2 == 1
+        assert all(len(a) == len(g[0]) for a in g)
+        width, height = (len(g) + 1) // 2, (len(g[0]) + 1) // 2
 
         return cls(
             cell_types=[
-                [CellType.from_symbol(g[2 * x][2 * y]) for y in range(5)]
-                for x in range(4)
+                [CellType.from_symbol(g[2 * x][2 * y]) for y in range(height)]
+                for x in range(width)
             ],
             horz_connected=[
-                [g[2 * x + 1][2 * y] == "-" for y in range(5)] for x in range(3)
+                [g[2 * x + 1][2 * y] == "-" for y in range(height)]
+                for x in range(width - 1)
             ],
             vert_connected=[
-                [g[2 * x][2 * y + 1] == "|" for y in range(4)] for x in range(4)
+                [g[2 * x][2 * y + 1] == "|" for y in range(height - 1)]
+                for x in range(width)
             ],
         )
 
@@ -370,13 +468,23 @@ class Level:
     # Theoretical min waste: for levels with at least 2 connected components of
     # cells, there must be at least one waste cell either adjacent to or inside
     # each connected component. The theoretical min waste is the minimum size
-    # of such a covering set.
-    theoretical_min_waste: int = 0
+    # of such a covering set, computed by bounds.theoretical_min_waste if not
+    # given.
+    theoretical_min_waste: Optional[int] = None
 
     can_place_metal: bool = False
 
+    # Must match the size of target_state
+    board: Board = Board()
 
-@dataclass
+    def __post_init__(self):
+        if self.theoretical_min_waste is None:
+            from .bounds import theoretical_min_waste
+
+            self.theoretical_min_waste = theoretical_min_waste(self.target_state)
+
+
+@dataclass(**_SLOTS)
 class Metrics:
     is_correct: bool
     num_rules: int
@@ -395,14 +503,175 @@ class StepResult:
     did_change: bool
 
 
+class PackedStates(Sequence):
+    """Sequence of States stored as packed ints, materialized on access
+
+    The order of live_cells is stored alongside each packed state, so
+    materialized states are equal to the ones which were packed.
+    """
+
+    __slots__ = ("packed", "width", "height", "_live_cells", "_typecode")
+
+    def __init__(self, width: int = 4, height: int = 5):
+        self.packed: list[int] = []
+        self.width = width
+        self.height = height
+        # Indices height * x + y of the live cells, in order
+        self._live_cells: list[Optional[array]] = []
+        # 2 bytes per index unless the board has more cells than that can index
+        self._typecode = "H" if width * height <= 1 << 16 else "L"
+
+    def append(self, state: State, packed: Optional[int] = None):
+        self.packed.append(state.pack() if packed is None else packed)
+        self._live_cells.append(
+            None
+            if state.live_cells is None
+            else array(
+                self._typecode,
+                (self.height * loc.x + loc.y for loc in state.live_cells),
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.packed)
+
+    @overload
+    def __getitem__(self, i: int) -> State:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[State]:
+        ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[State, list[State]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        state = State.unpack(self.packed[i], self.width, self.height)
+        live_cells = self._live_cells[i]
+        if live_cells is not None:
+            state.live_cells = [Coords(*divmod(c, self.height)) for c in live_cells]
+        return state
+
+    def __eq__(self, o: object) -> bool:
+        if isinstance(o, PackedStates):
+            return (
+                (self.width, self.height) == (o.width, o.height)
+                and self.packed == o.packed
+                and self._live_cells == o._live_cells
+            )
+        if isinstance(o, Sequence):
+            return list(self) == list(o)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"PackedStates({list(self)!r})"
+
+
+class RulesAppliedTrace(Sequence):
+    """Per-frame rules_applied grids stored in 5 bits per cell
+
+    trace[frame][x][y] is the index of the rule applied by the cell at (x, y)
+    in that frame, or None, as in StepResult.rules_applied.
+    """
+
+    __slots__ = ("width", "height", "_frame_bytes", "_buffer")
+
+    _NONE = 31
+
+    def __init__(self, width: int = 4, height: int = 5):
+        self.width = width
+        self.height = height
+        # 13 for the game's 20 cells
+        self._frame_bytes = (5 * width * height + 7) // 8
+        self._buffer = bytearray()
+
+    def append(self, rules_applied: list[list[Optional[int]]]):
+        packed = 0
+        for x in range(self.width):
+            for y in range(self.height):
+                rule_num = rules_applied[x][y]
+                assert rule_num is None or 0 <= rule_num < self._NONE
+                packed |= (self._NONE if rule_num is None else rule_num) << (
+                    5 * (self.height * x + y)
+                )
+        self._buffer += packed.to_bytes(self._frame_bytes, "little")
+
+    def __len__(self) -> int:
+        return len(self._buffer) // self._frame_bytes
+
+    @overload
+    def __getitem__(self, i: int) -> list[list[Optional[int]]]:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[list[list[Optional[int]]]]:
+        ...
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if not -len(self) <= i < len(self):
+            raise IndexError("frame index out of range")
+        i %= len(self)
+        packed = int.from_bytes(
+            self._buffer[i * self._frame_bytes : (i + 1) * self._frame_bytes],
+            "little",
+        )
+        grid: list[list[Optional[int]]] = []
+        for x in range(self.width):
+            column: list[Optional[int]] = []
+            for y in range(self.height):
+                rule_num = (packed >> (5 * (self.height * x + y))) & 31
+                column.append(None if rule_num == self._NONE else rule_num)
+            grid.append(column)
+        return grid
+
+    def __eq__(self, o: object) -> bool:
+        if isinstance(o, RulesAppliedTrace):
+            return (self.width, self.height) == (
+                o.width,
+                o.height,
+            ) and self._buffer == o._buffer
+        if isinstance(o, Sequence):
+            return list(self) == list(o)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"RulesAppliedTrace({list(self)!r})"
+
+
 @dataclass
 class SimulationResult:
     level: Level
     solution: Solution
 
-    states: list[State]
-    rules_applied: list[list[list[Optional[int]]]]
+    # Both are stored compactly; indexing materializes States/grids on demand
+    states: PackedStates
+    rules_applied: RulesAppliedTrace
 
     final_state: State
 
     metrics: Metrics
+
+    # Rolling hash of the packed states and stability, computed from states and
+    # metrics if not given. Results for the same level with equal trajectory
+    # hashes have identical states and identical metrics apart from
+    # num_rules/num_rules_conditional.
+    trajectory_hash: Optional[int] = None
+
+    def __post_init__(self):
+        if self.trajectory_hash is None:
+            packed = (
+                self.states.packed
+                if isinstance(self.states, PackedStates)
+                else [state.pack() for state in self.states]
+            )
+            h = 0
+            for v in [*packed, self.metrics.is_stable]:
+                h = (h * _TRAJECTORY_HASH_BASE + v) % _TRAJECTORY_HASH_MOD
+            self.trajectory_hash = h
+
+
+# Polynomial rolling hash over packed states, which fit in 111 bits
+_TRAJECTORY_HASH_MOD = (1 << 127) - 1
+_TRAJECTORY_HASH_BASE = 0x1E3779B97F4A7C15F39CC0605CEDC835
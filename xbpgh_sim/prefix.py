@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from .models import *
+from .models import _rule_fields
+from .analysis import analyze_rules
+from .compiler import compile_rules
+from .simulator import (
+    _initial_state,
+    _simulation_result,
+    settled_cells,
+    simulate_step,
+)
+
+
+__all__ = ["SharedPrefixStats", "simulate_shared_prefix"]
+
+
+@dataclass
+class SharedPrefixStats:
+    num_solutions: int = 0
+    # Steps the solutions would take if simulated separately
+    num_steps: int = 0
+    # Steps actually simulated
+    num_steps_simulated: int = 0
+
+
+def _fires(rule: Rule) -> bool:
+    return rule.target_type != CellType.IGNORE and rule.reaction != Reaction.IGNORE
+
+
+def _fell_through(prv_state: State, res: StepResult) -> set[CellType]:
+    """Types of the cells which no rule applied to, i.e. which consulted every
+    rule simulated"""
+    assert prv_state.live_cells is not None
+    return {
+        prv_state.cell_types[loc.x][loc.y]
+        for loc in prv_state.live_cells
+        if res.rules_applied[loc.x][loc.y] is None
+    }
+
+
+def simulate_shared_prefix(
+    level: Level,
+    solutions: list[Solution],
+    compiled: bool = False,
+    stats: Optional[SharedPrefixStats] = None,
+) -> list[SimulationResult]:
+    """Simulates many solutions, sharing frames between rulesets with common
+    prefixes
+
+    Gives the same results as simulate_solution for each solution. Solutions
+    with the same start position and metal are arranged in a trie by rule.
+    Each node simulates with only the rules its solutions share, and a frame is
+    shared by all of them as long as no cell fell through those rules to a
+    type targeted by a later rule of any of them. Otherwise the node splits on
+    its next rule and each child resumes from that frame. All solutions must
+    have the same number of rules, as saved solutions do.
+    """
+    assert len({len(solution.rules) for solution in solutions}) <= 1
+    stats = stats if stats is not None else SharedPrefixStats()
+    board = level.board
+    num_steps = board.num_frames + 1
+    results: list[Optional[SimulationResult]] = [None] * len(solutions)
+
+    def simulate_subtree(
+        indices: list[int],
+        depth: int,
+        initial: tuple[State, int],
+        frames: list[tuple[StepResult, int]],
+    ):
+        rules = solutions[indices[0]].rules
+        # Go straight to the first rule the solutions don't all share
+        while depth < len(rules) and all(
+            solutions[i].rules[depth] == rules[depth] for i in indices
+        ):
+            depth += 1
+        later_types = {
+            rule.target_type
+            for i in indices
+            for rule in solutions[i].rules[depth:]
+            if _fires(rule)
+        }
+
+        # Steps with only the shared rules, as in simulate_solution
+        prefix = rules[:depth]
+        if compiled:
+            compiled_step = compile_rules(tuple(prefix), board.width, board.height)
+        else:
+            live_rules = analyze_rules(prefix).live_rules
+            settled: Optional[set[Coords]] = None
+
+        frames = list(frames)
+        state = frames[-1][0].state if frames else initial[0]
+        while len(frames) < num_steps:
+            stats.num_steps_simulated += 1
+            if compiled:
+                res = compiled_step(state)
+            else:
+                res = simulate_step(state, prefix, live_rules, settled)
+                settled = settled_cells(state, prefix, res)
+            if not later_types.isdisjoint(_fell_through(state, res)):
+                break
+            state = res.state
+            frames.append((res, state.pack()))
+        else:
+            for i in indices:
+                results[i] = _simulation_result(
+                    level,
+                    solutions[i],
+                    initial,
+                    frames[:-1],
+                    not frames[-1][0].did_change,
+                )
+            return
+
+        # Some cell fell through to a later rule, so depth < len(rules)
+        children: dict[tuple, list[int]] = {}
+        for i in indices:
+            children.setdefault(_rule_fields(solutions[i].rules[depth]), []).append(i)
+        for child in children.values():
+            simulate_subtree(child, depth + 1, initial, frames)
+
+    # Solutions only share frames if they start from the same state
+    groups: dict[tuple, list[int]] = {}
+    for i, solution in enumerate(solutions):
+        key = (solution.start_pos, tuple(sorted(solution.metal_coords)))
+        groups.setdefault(key, []).append(i)
+    for indices in groups.values():
+        state = _initial_state(level, solutions[indices[0]])
+        simulate_subtree(indices, 0, (state, state.pack()), [])
+
+    stats.num_solutions += len(solutions)
+    stats.num_steps += len(solutions) * num_steps
+    return [result for result in results if result is not None]
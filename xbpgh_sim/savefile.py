@@ -1,60 +1,132 @@
 import base64
+import dataclasses
+import itertools
+import os
 import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Union
 
 from .models import *
+from .errors import *
 from .levels import LEVELS
 
 
-__all__ = ["parse_solution", "dump_solution", "parse_save_file"]
+__all__ = [
+    "decode_solution",
+    "decode_save_string",
+    "parse_solution",
+    "parse_solutions",
+    "encode_solution",
+    "dump_solution",
+    "parse_save_file",
+]
 
 
-def parse_solution(save_string: str) -> Solution:
-    """parses a decompressed solution"""
-    dat = zlib.decompress(base64.b64decode(save_string, validate=True))
+_CELL_TYPES = {t.value: t for t in CellType}
+_DIRECTIONS = {d.value: d for d in Direction}
+_REACTIONS = {r.value: r for r in Reaction}
+_DIVIDE_DIRECTIONS = {(d.delta().x, d.delta().y): d for d in Direction}
+_COORDS = {(x, y): Coords(x, y) for x in range(4) for y in range(5)}
+
+
+def _lookup(table: dict, enum_cls: type, value: int):
+    try:
+        return table[value]
+    except KeyError:
+        raise ValueError(f"{value} is not a valid {enum_cls.__name__}") from None
+
+
+# Encoded rule size by reaction value
+_RULE_SIZES = {
+    Reaction.DIVIDE.value: 21,
+    Reaction.FUSE.value: 17,
+    Reaction.SPECIALIZE.value: 17,
+}
+
+# The fields of already validated rules, by encoding. Each solution gets its own
+# Rule instances, since Rules are mutable.
+_DECODED_RULES: dict[bytes, tuple] = {}
+
+
+def _decode_rule(pop_int) -> Rule:
+    target_type = _lookup(_CELL_TYPES, CellType, pop_int(4))
+    neighbor_type = _lookup(_CELL_TYPES, CellType, pop_int(4))
+    neighbor_dir = _lookup(_DIRECTIONS, Direction, pop_int(4))
+    reaction = _lookup(_REACTIONS, Reaction, pop_int(1))
+
+    divide_dir = fuse_dir = spec_type = None
+    if reaction == Reaction.DIVIDE:
+        delta_x = pop_int(4)
+        delta_y = pop_int(4)
+        if (delta_x, delta_y) not in _DIVIDE_DIRECTIONS:
+            raise ValueError(f"Invalid divide direction {(delta_x, delta_y)}")
+        divide_dir = _DIVIDE_DIRECTIONS[delta_x, delta_y]
+    elif reaction == Reaction.FUSE:
+        fuse_dir = _lookup(_DIRECTIONS, Direction, pop_int(4))
+    elif reaction == Reaction.SPECIALIZE:
+        spec_type = _lookup(_CELL_TYPES, CellType, pop_int(4))
+
+    rule = Rule(
+        target_type,
+        neighbor_type,
+        neighbor_dir,
+        reaction,
+        divide_dir=divide_dir,
+        fuse_dir=fuse_dir,
+        spec_type=spec_type,
+    )
+    rule.check_rule()
+    return rule
+
+
+def decode_solution(dat: bytes, save_string: Optional[str] = None) -> Solution:
+    """decodes a decompressed solution"""
+    offset = 0
 
     def pop_int(b):
-        nonlocal dat
-        assert len(dat) >= b
-        res = int.from_bytes(dat[:b], "little", signed=True)
-        dat = dat[b:]
+        nonlocal offset
+        if len(dat) < offset + b:
+            raise SolutionError("Truncated solution")
+        res = int.from_bytes(dat[offset : offset + b], "little", signed=True)
+        offset += b
         return res
 
     # Version number
     version = pop_int(4)
     if version not in {1002, 1003}:
-        raise ValueError(f"Unknown save file version {version}")
+        raise SaveVersionError(f"Unknown save file version {version}")
 
     num_rules = pop_int(4)
-    assert num_rules == 16
+    if num_rules != 16:
+        raise SolutionError(f"Expected 16 rules, got {num_rules}")
     rules = []
-    for _ in range(num_rules):
-        target_type = CellType(pop_int(4))
-        neighbor_type = CellType(pop_int(4))
-        neighbor_dir = Direction(pop_int(4))
-        reaction = Reaction(pop_int(1))
-
-        rule = Rule(target_type, neighbor_type, neighbor_dir, reaction)
-
-        if reaction == Reaction.DIVIDE:
-            delta_x = pop_int(4)
-            delta_y = pop_int(4)
-            rule.divide_dir = next(
-                dir for dir in Direction if dir.delta() == Coords(delta_x, delta_y)
-            )
-        elif reaction == Reaction.FUSE:
-            fuse_dir = Direction(pop_int(4))
-            rule.fuse_dir = fuse_dir
-        elif reaction == Reaction.SPECIALIZE:
-            spec_type = CellType(pop_int(4))
-            rule.spec_type = spec_type
-
-        rule.check_rule()
+    for i in range(num_rules):
+        if len(dat) < offset + 13:
+            raise SolutionError("Truncated solution")
+        size = _RULE_SIZES.get(dat[offset + 12], 13)
+        key = dat[offset : offset + size]
+        fields = _DECODED_RULES.get(key)
+        if fields is None:
+            # Every valid rule encoding decodes the same way, and there are
+            # at most about ten thousand of them
+            try:
+                rule = _decode_rule(pop_int)
+            except SolutionError:
+                raise
+            except (AssertionError, ValueError) as e:
+                raise RuleError(f"Invalid rule {i}: {e or repr(e)}") from e
+            _DECODED_RULES[key] = dataclasses.astuple(rule)
+        else:
+            offset += size
+            rule = Rule(*fields)
         rules.append(rule)
 
     start_x = pop_int(4)
     start_y = pop_int(4)
-    start_loc = Coords(start_x, start_y)
-    assert start_loc.in_bounds()
+    if (start_x, start_y) not in _COORDS:
+        raise StartPositionError(f"Invalid starting position {(start_x, start_y)}")
+    start_loc = _COORDS[start_x, start_y]
 
     metal_coords = []
     if version == 1003:
@@ -62,17 +134,96 @@ def parse_solution(save_string: str) -> Solution:
         for _ in range(num_metal):
             x = pop_int(4)
             y = pop_int(4)
-            loc = Coords(x, y)
-            assert loc.in_bounds()
-            assert loc not in metal_coords
-            metal_coords.append(loc)
+            if (x, y) not in _COORDS or _COORDS[x, y] in metal_coords:
+                raise SolutionError(f"Invalid metal position {(x, y)}")
+            metal_coords.append(_COORDS[x, y])
 
-    assert len(dat) == 0
+    if offset != len(dat):
+        raise SolutionError(f"{len(dat) - offset} extra bytes after solution")
 
     return Solution(rules, start_loc, metal_coords, save_string=save_string)
 
 
-def dump_solution(solution: Solution) -> str:
+def decode_save_string(save_string: str) -> bytes:
+    """base64 decodes and decompresses a solution string"""
+    try:
+        return zlib.decompress(base64.b64decode(save_string, validate=True))
+    except (ValueError, zlib.error) as e:
+        raise SolutionError(f"Undecodable save string: {e}") from e
+
+
+def parse_solution(save_string: str) -> Solution:
+    """parses a compressed and base64 encoded solution"""
+    return decode_solution(decode_save_string(save_string), save_string)
+
+
+def parse_solutions(
+    save_strings: Iterable[str], workers: Optional[int] = None, chunk_size: int = 256
+) -> Iterator[Solution]:
+    """parses many solutions, decoding and decompressing them in a thread pool
+
+    Chunks of save strings are base64 decoded and decompressed in worker
+    threads (zlib releases the GIL) while earlier chunks are decoded into
+    Solutions on the calling thread. Solutions are yielded in input order.
+    """
+    for solution in _parse_each(save_strings, workers, chunk_size):
+        if isinstance(solution, Exception):
+            raise solution
+        yield solution
+
+
+def _parse_each(
+    save_strings: Iterable[str], workers: Optional[int] = None, chunk_size: int = 256
+) -> Iterator[Union[Solution, Exception]]:
+    """parse_solutions, yielding the error of each save string which fails to
+    parse in its place"""
+
+    def decode_chunk(chunk: list[str]) -> list[Union[bytes, Exception]]:
+        decoded: list[Union[bytes, Exception]] = []
+        for save_string in chunk:
+            try:
+                decoded.append(decode_save_string(save_string))
+            except Exception as e:
+                decoded.append(e)
+        return decoded
+
+    def chunks() -> Iterator[list[str]]:
+        it = iter(save_strings)
+        while True:
+            chunk = list(itertools.islice(it, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) + 4)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Executor.map submits every chunk up front; keep a bounded window
+        window: deque = deque()
+        for chunk in chunks():
+            window.append((chunk, executor.submit(decode_chunk, chunk)))
+            if len(window) > 2 * workers:
+                yield from _decode_chunk_result(*window.popleft())
+        while window:
+            yield from _decode_chunk_result(*window.popleft())
+
+
+def _decode_chunk_result(
+    chunk: list[str], future: Future
+) -> Iterator[Union[Solution, Exception]]:
+    for save_string, dat in zip(chunk, future.result()):
+        if isinstance(dat, Exception):
+            yield dat
+            continue
+        try:
+            yield decode_solution(dat, save_string)
+        except Exception as e:
+            yield e
+
+
+def encode_solution(solution: Solution) -> bytes:
+    """encodes a solution as an uncompressed version 1003 save"""
     dat = b""
 
     def push_int(b, v):
@@ -112,23 +263,63 @@ def dump_solution(solution: Solution) -> str:
         push_int(4, coords.x)
         push_int(4, coords.y)
 
-    return base64.b64encode(zlib.compress(dat)).decode("ascii")
+    return dat
 
 
-def parse_save_file(f) -> dict[int, dict[int, Solution]]:
-    solutions = {level.level_id: {} for level in LEVELS}
-    for line in f:
+def dump_solution(solution: Solution) -> str:
+    return base64.b64encode(zlib.compress(encode_solution(solution))).decode("ascii")
+
+
+def parse_save_file(
+    f, levels: Optional[list[Level]] = None, errors: Optional[ErrorLog] = None
+) -> dict[int, dict[int, Solution]]:
+    """Solutions by level ID and slot, for LEVELS or the given levels
+
+    Save strings are decoded in batches, see parse_solutions. With errors (bulk
+    mode), solution lines which fail to parse are recorded there along with
+    their line number, and skipped, instead of raising.
+    """
+    solutions = {level.level_id: {} for level in (LEVELS if levels is None else levels)}
+
+    # (line number, line, (level ID, slot, save string) or the error of its key)
+    entries: list[tuple[int, str, Union[tuple[int, int, str], Exception]]] = []
+    for line_number, line in enumerate(f, 1):
         line = line.rstrip("\n")
         if " = " in line:
-            key, val = line.split(" = ")
+            key, val = line.split(" = ", 1)
             key = key.split(".")
             val = val.strip()
-            if key[0] == "Toronto" and key[1] == "Solution":
-                level_id = int(key[2])
-                save_slot = int(key[3])
+            if key[0] == "Toronto" and key[1:2] == ["Solution"]:
+                try:
+                    try:
+                        level_id, save_slot = int(key[2]), int(key[3])
+                    except (IndexError, ValueError):
+                        raise SolutionError(f"Invalid key {'.'.join(key)}") from None
+
+                    if level_id not in solutions:
+                        raise UnknownLevelError(f"Unknown level ID {level_id}")
+                    entries.append((line_number, line, (level_id, save_slot, val)))
+                except Exception as e:
+                    entries.append((line_number, line, e))
 
-                solution = parse_solution(val)
-                # Check round-tripping the solution
-                # assert dat == dump_solution(solution)
+    # Errors are raised or recorded in line order
+    parsed = _parse_each(
+        entry[2] for _, _, entry in entries if not isinstance(entry, Exception)
+    )
+    try:
+        for line_number, line, entry in entries:
+            try:
+                if isinstance(entry, Exception):
+                    raise entry
+                level_id, save_slot, _ = entry
+                solution = next(parsed)
+                if isinstance(solution, Exception):
+                    raise solution
                 solutions[level_id][save_slot] = solution
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors.record(e, line_number=line_number, line=line)
+    finally:
+        parsed.close()
     return solutions
@@ -0,0 +1,223 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Sequence
+
+from .models import *
+
+
+__all__ = ["DistanceWeights", "TargetDistance", "TargetScorer", "target_scorer"]
+
+
+@dataclass(frozen=True)
+class DistanceWeights:
+    cell_types: float = 1.0
+    horz_connected: float = 1.0
+    vert_connected: float = 1.0
+    extra_tissue: float = 1.0
+    missing_tissue: float = 1.0
+
+
+@dataclass(frozen=True)
+class TargetDistance:
+    # Cells with a different type, other than those counted as extra or missing
+    num_cell_types: int
+    num_horz_connected: int
+    num_vert_connected: int
+    # Living cells where the target has none, and the other way around
+    num_extra_tissue: int
+    num_missing_tissue: int
+
+
+if hasattr(int, "bit_count"):
+    _bit_count = int.bit_count
+else:
+    # Python < 3.10
+    def _bit_count(v: int) -> int:
+        return bin(v).count("1")
+
+
+def _repeat_nibble(value: int, num_cells: int) -> int:
+    return int(f"{value:x}" * num_cells, 16) if num_cells else 0
+
+
+class TargetScorer:
+    """Weighted distance of packed states (see State.pack) from a target
+
+    Each count is the popcount of a few bit operations on the whole state, with
+    masks precomputed from the target. score_batch does the same operations
+    over an array of states at once, which is the fast path for many states;
+    score_many picks between the two.
+    """
+
+    def __init__(self, target: State, weights: DistanceWeights = DistanceWeights()):
+        self.weights = weights
+        self.width, self.height = target.width, target.height
+        num_cells = self.width * self.height
+        num_horz = (self.width - 1) * self.height
+        num_vert = self.width * (self.height - 1)
+
+        self.target = target.pack()
+        # Bit 0 of each 4-bit cell type
+        self.low_mask = _repeat_nibble(1, num_cells)
+        self.types_mask = _repeat_nibble(0xF, num_cells)
+        self.horz_mask = ((1 << num_horz) - 1) << (4 * num_cells)
+        self.vert_mask = ((1 << num_vert) - 1) << (4 * num_cells + num_horz)
+        self.target_living = self._living(self.target)
+        self._masks = (
+            self.target,
+            self.low_mask,
+            self.types_mask,
+            self.horz_mask,
+            self.vert_mask,
+            self.target_living,
+        )
+        self._weights = (
+            weights.cell_types,
+            weights.horz_connected,
+            weights.vert_connected,
+            weights.extra_tissue,
+            weights.missing_tissue,
+        )
+        # Packed states as little-endian 64-bit words, for score_batch
+        self.num_words = (4 * num_cells + num_horz + num_vert + 63) // 64
+
+    def _nonzero(self, types: int) -> int:
+        """Bit 0 of each cell type set where the type is nonzero"""
+        types |= types >> 2
+        return (types | types >> 1) & self.low_mask
+
+    def _living(self, packed: int) -> int:
+        """Bit 0 of each cell type set where the cell is living"""
+        # In a state every cell is living, METAL (0b1011) or NONE (0b1101),
+        # and only the latter two have bits 0 and 3 set and bits 1 and 2 unequal
+        dead = packed & packed >> 3 & (packed >> 1 ^ packed >> 2) & self.low_mask
+        return dead ^ self.low_mask
+
+    def _counts(self, packed: int) -> tuple[int, int, int, int, int]:
+        """The counts of distance, in TargetDistance order"""
+        # _living and _nonzero inlined, with the masks in one tuple, since the
+        # lookups cost about as much as the bit operations
+        target, low, types_mask, horz_mask, vert_mask, target_living = self._masks
+        diff = packed ^ target
+        living = (packed & packed >> 3 & (packed >> 1 ^ packed >> 2) & low) ^ low
+        # Cells differing in whether they're living also differ in type
+        living_diff = living ^ target_living
+        types = diff & types_mask
+        types |= types >> 2
+        return (
+            _bit_count((types | types >> 1) & low ^ living_diff),
+            _bit_count(diff & horz_mask),
+            _bit_count(diff & vert_mask),
+            _bit_count(living_diff & living),
+            _bit_count(living_diff & target_living),
+        )
+
+    def distance(self, packed: int) -> TargetDistance:
+        return TargetDistance(*self._counts(packed))
+
+    def score(self, packed: int) -> float:
+        """Weighted sum of the counts of distance, which (with positive weights)
+        is 0 only for the target itself
+
+        For many states, score_many and score_batch are several times faster.
+        """
+        w_types, w_horz, w_vert, w_extra, w_missing = self._weights
+        types, horz, vert, extra, missing = self._counts(packed)
+        return (
+            w_types * types
+            + w_horz * horz
+            + w_vert * vert
+            + w_extra * extra
+            + w_missing * missing
+        )
+
+    def score_many(self, packed_states: Sequence[int]) -> list[float]:
+        """score of each state, through score_batch if there are enough states
+        to make up for its fixed cost and numpy is installed"""
+        if len(packed_states) >= _BATCH_MIN_STATES:
+            try:
+                return self.score_batch(packed_states).tolist()
+            except ImportError:
+                pass
+        return [self.score(packed) for packed in packed_states]
+
+    def score_batch(self, packed_states: Sequence[int]):
+        """score of each state, as a numpy float64 array. Requires numpy."""
+        import numpy
+
+        num_bytes = 8 * self.num_words
+
+        def words(v: int) -> "numpy.ndarray":
+            return numpy.frombuffer(v.to_bytes(num_bytes, "little"), "<u8")
+
+        target = words(self.target)
+        low = words(self.low_mask)
+        types_mask = words(self.types_mask)
+        horz_mask = words(self.horz_mask)
+        vert_mask = words(self.vert_mask)
+        target_living = words(self.target_living)
+        w = self.weights
+
+        def count(bits) -> "numpy.ndarray":
+            return _bitwise_count(bits).sum(axis=1, dtype=numpy.int64)
+
+        scores = numpy.empty(len(packed_states), numpy.float64)
+        # In chunks, so temporaries stay in cache
+        for start in range(0, len(packed_states), _BATCH_CHUNK):
+            chunk = packed_states[start : start + _BATCH_CHUNK]
+            # Cell types are 4-bit aligned, so they never straddle a word and
+            # the same operations as score work word by word
+            states = numpy.frombuffer(
+                b"".join(p.to_bytes(num_bytes, "little") for p in chunk), "<u8"
+            ).reshape(-1, self.num_words)
+
+            diff = states ^ target
+            dead = states & states >> 3 & (states >> 1 ^ states >> 2) & low
+            living = dead ^ low
+            living_diff = living ^ target_living
+            types = diff & types_mask
+            types |= types >> 2
+            nonzero = (types | types >> 1) & low
+
+            scores[start : start + len(chunk)] = (
+                w.cell_types * count(nonzero ^ living_diff)
+                + w.horz_connected * count(diff & horz_mask)
+                + w.vert_connected * count(diff & vert_mask)
+                + w.extra_tissue * count(living_diff & living)
+                + w.missing_tissue * count(living_diff & target_living)
+            )
+        return scores
+
+
+# States per chunk of score_batch
+_BATCH_CHUNK = 4096
+# Fewest states score_many scores with score_batch, below which its fixed cost
+# of about 20 numpy operations outweighs scoring each state
+_BATCH_MIN_STATES = 64
+
+
+def _bitwise_count(a):
+    import numpy
+
+    if hasattr(numpy, "bitwise_count"):
+        return numpy.bitwise_count(a)
+    # numpy < 2.0
+    table = numpy.array([bin(i).count("1") for i in range(256)], numpy.uint8)
+    return table[a.view(numpy.uint8)].reshape(*a.shape, -1).sum(axis=-1)
+
+
+@lru_cache(maxsize=None)
+def _target_scorer(
+    width: int, height: int, packed_target: int, weights: DistanceWeights
+) -> TargetScorer:
+    return TargetScorer(State.unpack(packed_target, width, height), weights)
+
+
+def target_scorer(
+    level: Level, weights: Optional[DistanceWeights] = None
+) -> TargetScorer:
+    """The TargetScorer of a level's target, cached by target and weights"""
+    target = level.target_state
+    return _target_scorer(
+        target.width, target.height, target.pack(), weights or DistanceWeights()
+    )
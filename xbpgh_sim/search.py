@@ -0,0 +1,460 @@
+import dataclasses
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from .models import *
+from .bounds import SPEC_SOURCES, metric_bounds
+from .canonical import solution_fingerprint
+from .checkpoint import Checkpoint
+from .savefile import dump_solution
+from .scoring import DistanceWeights, target_scorer
+from .simulator import simulate_final
+
+
+__all__ = ["SearchConfig", "Candidate", "SearchProgress", "evolve"]
+
+
+@dataclass
+class SearchConfig:
+    num_islands: int = 4
+    population_size: int = 64
+    # Generations each island runs between migrations
+    migration_interval: int = 10
+    # Number of best candidates sent from each island to the next one
+    num_migrants: int = 2
+    # Best candidates copied unchanged into the next generation
+    num_elites: int = 2
+    tournament_size: int = 3
+    crossover_rate: float = 0.5
+    # Maximum number of non-empty rules in a candidate
+    max_rules: int = 8
+    # Weights of the distance from the target candidates are ranked by
+    weights: DistanceWeights = DistanceWeights()
+    # Per island; None to run until stopped
+    max_generations: Optional[int] = None
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.num_islands < 1 or self.migration_interval < 1:
+            raise ValueError("num_islands and migration_interval must be positive")
+        if not 1 <= self.tournament_size <= self.population_size:
+            raise ValueError(
+                "tournament_size must be between 1 and population_size"
+                f" ({self.population_size})"
+            )
+        if not 0 <= self.num_elites <= self.population_size:
+            raise ValueError("num_elites must be at most population_size")
+        if not 0 <= self.num_migrants <= self.population_size:
+            raise ValueError("num_migrants must be at most population_size")
+        if not 1 <= self.max_rules <= 16:
+            raise ValueError("max_rules must be between 1 and 16")
+
+
+@dataclass
+class Candidate:
+    rules: list[Rule]
+    start_pos: Coords
+
+    # Set once evaluated
+    metrics: Optional[Metrics] = None
+    # Weighted distance of the final state from the target (see TargetScorer)
+    distance: Optional[float] = None
+
+    def fitness(self) -> tuple:
+        """Sort key, lower is better: closeness to the target, then metrics"""
+        assert self.metrics is not None and self.distance is not None
+        return (
+            self.distance,
+            not self.metrics.is_stable,
+            self.metrics.num_rules,
+            self.metrics.num_frames,
+            self.metrics.num_waste,
+        )
+
+    def solution(self) -> Solution:
+        solution = Solution(
+            rules=list(self.rules), start_pos=self.start_pos, metal_coords=[]
+        )
+        solution.save_string = dump_solution(solution)
+        return solution
+
+
+@dataclass
+class SearchProgress:
+    # Generations run by each island so far
+    generation: int
+    elapsed: float
+    # Generations of all islands per second
+    generations_per_second: float
+    # Simulated candidates per second (repeats are served from a cache)
+    evaluations_per_second: float
+    best: Candidate
+    # Whether best meets every bound of metric_bounds, so search can stop
+    is_optimal: bool
+
+
+@dataclass
+class _Island:
+    population: list[Candidate]
+    rng_state: tuple
+    num_evaluations: int = 0
+
+
+def _empty_rule() -> Rule:
+    return Rule(CellType.IGNORE, CellType.IGNORE, Direction.RIGHT, Reaction.IGNORE)
+
+
+@dataclass
+class _Space:
+    """What mutations draw from for a level"""
+
+    # SEED, every type in the target, and every type those are specialized from
+    cell_types: list[CellType]
+    neighbor_types: list[CellType]
+    start_positions: list[Coords]
+
+    @classmethod
+    def for_level(cls, level: Level) -> "_Space":
+        cell_types = {CellType.SEED}
+        for a in level.target_state.cell_types:
+            for t in a:
+                while t.is_living() and t != CellType.SEED:
+                    cell_types.add(t)
+                    t = SPEC_SOURCES[t]
+        # Ordered by value, so draws don't depend on set iteration order
+        cell_types_list = sorted(cell_types, key=lambda t: t.value)
+        neighbor_types = cell_types_list + [CellType.NONE, CellType.ANY]
+        if any(CellType.METAL in a for a in level.target_state.cell_types):
+            neighbor_types.append(CellType.METAL)
+        return cls(
+            cell_types=cell_types_list,
+            neighbor_types=neighbor_types,
+            start_positions=[
+                Coords(x, y)
+                for x in range(level.board.width)
+                for y in range(level.board.height)
+                if level.target_state.cell_types[x][y] != CellType.METAL
+            ],
+        )
+
+
+def _random_rule(rng: random.Random, space: _Space) -> Rule:
+    """A random valid rule over the level's cell types"""
+    directions = list(Direction)
+    while True:
+        target_type = rng.choice(space.cell_types)
+        reaction = rng.choice(
+            [
+                Reaction.DIVIDE,
+                Reaction.DIVIDE,
+                Reaction.SPECIALIZE,
+                Reaction.FUSE,
+                Reaction.DIE,
+            ]
+        )
+        neighbor_type = (
+            CellType.IGNORE if rng.random() < 0.5 else rng.choice(space.neighbor_types)
+        )
+        rule = Rule(
+            target_type,
+            neighbor_type,
+            rng.choice(directions),
+            reaction,
+            divide_dir=rng.choice(directions) if reaction == Reaction.DIVIDE else None,
+            fuse_dir=rng.choice(directions) if reaction == Reaction.FUSE else None,
+            spec_type=(
+                rng.choice(space.cell_types)
+                if reaction == Reaction.SPECIALIZE
+                else None
+            ),
+        )
+        try:
+            rule.check_rule()
+        except AssertionError:
+            continue
+        return rule
+
+
+def _with_condition(rng: random.Random, space: _Space, rule: Rule) -> Optional[Rule]:
+    """The rule with a new neighbor condition, or None if that's invalid"""
+    neighbor_type = (
+        CellType.IGNORE if rng.random() < 0.3 else rng.choice(space.neighbor_types)
+    )
+    new_rule = Rule(
+        rule.target_type,
+        neighbor_type,
+        rng.choice(list(Direction)),
+        rule.reaction,
+        rule.divide_dir,
+        rule.fuse_dir,
+        rule.spec_type,
+    )
+    try:
+        new_rule.check_rule()
+    except AssertionError:
+        return None
+    return new_rule
+
+
+def _mutate(
+    rng: random.Random, space: _Space, config: SearchConfig, c: Candidate
+) -> Candidate:
+    rules = list(c.rules)
+    start_pos = c.start_pos
+    used = [i for i, rule in enumerate(rules) if rule.target_type != CellType.IGNORE]
+    empty = [i for i, rule in enumerate(rules) if rule.target_type == CellType.IGNORE]
+
+    kind = rng.random()
+    if kind < 0.3 or not used:
+        # Add or replace a rule
+        if empty and len(used) < config.max_rules and (rng.random() < 0.5 or not used):
+            rules[rng.choice(empty)] = _random_rule(rng, space)
+        elif used:
+            rules[rng.choice(used)] = _random_rule(rng, space)
+    elif kind < 0.5:
+        i = rng.choice(used)
+        new_rule = _with_condition(rng, space, rules[i])
+        if new_rule is not None:
+            rules[i] = new_rule
+    elif kind < 0.7:
+        # Priority order
+        i, j = rng.choice(used), rng.randrange(len(rules))
+        rules[i], rules[j] = rules[j], rules[i]
+    elif kind < 0.85:
+        start_pos = rng.choice(space.start_positions)
+    else:
+        rules[rng.choice(used)] = _empty_rule()
+
+    return Candidate(rules, start_pos)
+
+
+def _crossover(
+    rng: random.Random, config: SearchConfig, a: Candidate, b: Candidate
+) -> Candidate:
+    """Rule slots taken from either parent, keeping their priority positions"""
+    rules = [ra if rng.random() < 0.5 else rb for ra, rb in zip(a.rules, b.rules)]
+    used = [i for i, rule in enumerate(rules) if rule.target_type != CellType.IGNORE]
+    for i in used[config.max_rules :]:
+        rules[i] = _empty_rule()
+    return Candidate(rules, rng.choice([a.start_pos, b.start_pos]))
+
+
+# Fitness of already simulated candidates in this process, by level and
+# solution fingerprint, so repeats (elites, no-op mutations, equivalent
+# rulesets) aren't simulated again
+_EVALUATED: dict[tuple, dict[str, tuple[Metrics, float]]] = {}
+_MAX_EVALUATED = 1 << 16
+
+
+def _evaluate(
+    level: Level, weights: DistanceWeights, population: list[Candidate]
+) -> int:
+    """Evaluates the unevaluated candidates, returning the number simulated"""
+    key = (level.level_id, level.target_state.pack(), weights)
+    cache = _EVALUATED.setdefault(key, {})
+    if len(cache) > _MAX_EVALUATED:
+        cache.clear()
+
+    # Simulate each distinct behavior once
+    pending: dict[str, list[Candidate]] = {}
+    for c in population:
+        if c.metrics is not None:
+            continue
+        fingerprint = solution_fingerprint(
+            Solution(rules=c.rules, start_pos=c.start_pos, metal_coords=[])
+        )
+        if fingerprint in cache:
+            c.metrics, c.distance = cache[fingerprint]
+        else:
+            pending.setdefault(fingerprint, []).append(c)
+
+    # Compiled, since candidates sharing rules (with different start positions)
+    # then share a step function
+    finals = [
+        simulate_final(
+            level,
+            Solution(rules=c[0].rules, start_pos=c[0].start_pos, metal_coords=[]),
+            compiled=True,
+        )
+        for c in pending.values()
+    ]
+    # Scored together, since score_many batches large populations
+    distances = target_scorer(level, weights).score_many(
+        [packed for _, packed in finals]
+    )
+    for (fingerprint, candidates), (metrics, _), distance in zip(
+        pending.items(), finals, distances
+    ):
+        cache[fingerprint] = metrics, distance
+        for c in candidates:
+            c.metrics, c.distance = metrics, distance
+    return len(pending)
+
+
+def _initial_island(level: Level, config: SearchConfig, seed: int) -> _Island:
+    rng = random.Random(seed)
+    space = _Space.for_level(level)
+    population = []
+    for _ in range(config.population_size):
+        rules = [_empty_rule() for _ in range(16)]
+        for i in rng.sample(range(16), rng.randint(1, config.max_rules)):
+            rules[i] = _random_rule(rng, space)
+        population.append(Candidate(rules, rng.choice(space.start_positions)))
+    return _Island(population, rng.getstate())
+
+
+def _run_island(
+    level: Level, config: SearchConfig, island: _Island, num_generations: int
+) -> _Island:
+    """Evolves an island for num_generations; runs in a worker process"""
+    rng = random.Random()
+    rng.setstate(island.rng_state)
+    space = _Space.for_level(level)
+    population = island.population
+    num_evaluations = island.num_evaluations + _evaluate(
+        level, config.weights, population
+    )
+
+    def tournament() -> Candidate:
+        return min(
+            rng.sample(population, config.tournament_size), key=Candidate.fitness
+        )
+
+    for _ in range(num_generations):
+        population.sort(key=Candidate.fitness)
+        offspring = population[: config.num_elites]
+        while len(offspring) < config.population_size:
+            if rng.random() < config.crossover_rate:
+                child = _crossover(rng, config, tournament(), tournament())
+            else:
+                child = tournament()
+            offspring.append(_mutate(rng, space, config, child))
+        population = offspring
+        num_evaluations += _evaluate(level, config.weights, population)
+
+    population.sort(key=Candidate.fitness)
+    return _Island(population, rng.getstate(), num_evaluations)
+
+
+def _migrate(islands: list[_Island], num_migrants: int):
+    """Replaces the worst candidates of each island with the best of the previous
+    one, in a ring"""
+    migrants = [island.population[:num_migrants] for island in islands]
+    for i, island in enumerate(islands):
+        incoming = migrants[i - 1]
+        island.population[len(island.population) - len(incoming) :] = [
+            Candidate(c.rules, c.start_pos, c.metrics, c.distance) for c in incoming
+        ]
+        island.population.sort(key=Candidate.fitness)
+
+
+def evolve(
+    level: Level,
+    config: Optional[SearchConfig] = None,
+    workers: Optional[int] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    resume: bool = False,
+) -> Iterator[SearchProgress]:
+    """Searches for good solutions to a level with an island genetic algorithm
+
+    Each island evolves in a worker process for config.migration_interval
+    generations, then the best candidates of each island migrate to the next.
+    Yields the best candidate so far after every such round, until
+    config.max_generations or a provably optimal solution. Results depend only
+    on the level and config, not on workers or timing.
+
+    With checkpoint, the islands are saved after a round whenever
+    checkpoint.interval has passed, and when the search is stopped early. With
+    resume, the search continues from the checkpoint if there is one, with the
+    same results as if it had never stopped. Only max_generations may differ
+    from the config of the checkpointed search. The checkpoint is removed once
+    the search finishes.
+    """
+    config = config or SearchConfig()
+    bounds = metric_bounds(level)
+    level_key = (level.level_id, level.target_state.pack())
+
+    saved = checkpoint.load() if checkpoint is not None and resume else None
+    if saved is not None:
+        if saved["level"] != level_key:
+            raise ValueError("Checkpoint is of a search on a different level")
+        if saved["config"] != dataclasses.replace(
+            config, max_generations=saved["config"].max_generations
+        ):
+            raise ValueError("Checkpoint is of a search with a different config")
+        islands, generation = saved["islands"], saved["generation"]
+        start = time.perf_counter() - saved["elapsed"]
+    else:
+        islands = [
+            _initial_island(level, config, config.seed * config.num_islands + i)
+            for i in range(config.num_islands)
+        ]
+        generation = 0
+        start = time.perf_counter()
+
+    def save():
+        assert checkpoint is not None
+        checkpoint.save(
+            dict(
+                level=level_key,
+                config=config,
+                islands=islands,
+                generation=generation,
+                elapsed=time.perf_counter() - start,
+            )
+        )
+
+    finished = False
+    try:
+        with ProcessPoolExecutor(max_workers=workers or config.num_islands) as executor:
+            while config.max_generations is None or generation < config.max_generations:
+                num_generations = config.migration_interval
+                if config.max_generations is not None:
+                    num_generations = min(
+                        num_generations, config.max_generations - generation
+                    )
+                new_islands = list(
+                    executor.map(
+                        _run_island,
+                        [level] * len(islands),
+                        [config] * len(islands),
+                        islands,
+                        [num_generations] * len(islands),
+                    )
+                )
+                _migrate(new_islands, config.num_migrants)
+                islands, generation = new_islands, generation + num_generations
+                if checkpoint is not None and checkpoint.due():
+                    save()
+
+                best = min(
+                    (island.population[0] for island in islands),
+                    key=Candidate.fitness,
+                )
+                assert best.metrics is not None
+                elapsed = time.perf_counter() - start
+                is_optimal = len(bounds.proven_optimal(best.metrics)) == 3
+                yield SearchProgress(
+                    generation=generation,
+                    elapsed=elapsed,
+                    generations_per_second=generation * len(islands) / elapsed,
+                    evaluations_per_second=sum(
+                        island.num_evaluations for island in islands
+                    )
+                    / elapsed,
+                    best=best,
+                    is_optimal=is_optimal,
+                )
+                if is_optimal:
+                    break
+        finished = True
+    finally:
+        # Also runs when the caller stops iterating or is interrupted
+        if checkpoint is not None:
+            if finished:
+                checkpoint.remove()
+            else:
+                save()
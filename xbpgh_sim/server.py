@@ -0,0 +1,297 @@
+import asyncio
+import io
+import json
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Optional
+
+from .models import *
+from .savefile import parse_solution, parse_save_file
+from .simulator import simulate_solution
+from .validation import LEVELS_BY_ID, validation_record
+
+
+__all__ = ["ValidationServer", "serve"]
+
+
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+
+class _LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()
+
+    def get(self, key) -> Optional[Any]:
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, reason: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+# The server and each worker process keep their own LRU of parsed solutions
+@lru_cache(maxsize=4096)
+def _parse_solution_cached(save_string: str) -> Solution:
+    return parse_solution(save_string)
+
+
+def _simulate_metrics(
+    level_id: int, save_string: str, level: Optional[Level] = None
+) -> Metrics:
+    if level is None:
+        level = LEVELS_BY_ID[level_id]
+    return simulate_solution(level, _parse_solution_cached(save_string)).metrics
+
+
+class ValidationServer:
+    """HTTP server returning validate_all --json records
+
+    Endpoints:
+      POST /validate       JSON body {"level_id": int, "solution": str, "slot": int}
+      POST /validate_save  Body is the contents of a save file
+      GET  /stats          Request, cache and latency counters
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        cache_size: int = 65536,
+        max_pending: int = 256,
+        levels: Optional[list[Level]] = None,
+    ):
+        # levels defaults to LEVELS
+        self.levels = levels
+        self.levels_by_id = (
+            LEVELS_BY_ID
+            if levels is None
+            else {level.level_id: level for level in levels}
+        )
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.results = _LRUCache(cache_size)
+        self.max_pending = max_pending
+        self.num_pending = 0
+
+        self.start_time = time.monotonic()
+        self.num_requests = 0
+        self.num_rejected = 0
+        self.num_errors = 0
+        self.num_simulated = 0
+        self.num_cache_hits = 0
+        self.latencies: deque[float] = deque(maxlen=10000)
+
+    async def metrics(self, level_id: int, save_string: str) -> Metrics:
+        key = (level_id, save_string)
+        metrics = self.results.get(key)
+        if metrics is not None:
+            self.num_cache_hits += 1
+            return metrics
+
+        loop = asyncio.get_running_loop()
+        # Custom levels are sent along, since workers only know LEVELS
+        metrics = await loop.run_in_executor(
+            self.executor,
+            _simulate_metrics,
+            level_id,
+            save_string,
+            None if self.levels is None else self.levels_by_id[level_id],
+        )
+        self.num_simulated += 1
+        self.results.put(key, metrics)
+        return metrics
+
+    async def validate(self, request: dict) -> list[dict]:
+        try:
+            level = self.levels_by_id[int(request["level_id"])]
+            save_string = str(request["solution"]).strip()
+            slot = int(request.get("slot", 0))
+            # Parse up front so malformed solutions are reported as bad requests
+            solution = _parse_solution_cached(save_string)
+        except (KeyError, ValueError, TypeError, AssertionError) as e:
+            raise _HTTPError(400, "Bad Request", f"Invalid request: {e!r}")
+
+        include_solution = bool(request.get("include_solution", False))
+        try:
+            metrics = await self.metrics(level.level_id, save_string)
+        except ValueError as e:
+            raise _HTTPError(400, "Bad Request", str(e))
+        return [validation_record(level, slot, solution, metrics, include_solution)]
+
+    async def validate_save(self, body: str, include_solution: bool) -> list[dict]:
+        try:
+            solutions = parse_save_file(io.StringIO(body), self.levels)
+        except (KeyError, ValueError, TypeError, AssertionError) as e:
+            raise _HTTPError(400, "Bad Request", f"Invalid save file: {e!r}")
+
+        entries = [
+            (level, slot, solution)
+            for level in self.levels_by_id.values()
+            for slot, solution in solutions[level.level_id].items()
+        ]
+        try:
+            all_metrics = await asyncio.gather(
+                *(
+                    self.metrics(level.level_id, solution.save_string)
+                    for level, _, solution in entries
+                )
+            )
+        except ValueError as e:
+            raise _HTTPError(400, "Bad Request", str(e))
+        return [
+            validation_record(level, slot, solution, metrics, include_solution)
+            for (level, slot, solution), metrics in zip(entries, all_metrics)
+        ]
+
+    def stats(self) -> dict:
+        uptime = time.monotonic() - self.start_time
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return dict(
+            uptime=uptime,
+            num_requests=self.num_requests,
+            num_rejected=self.num_rejected,
+            num_errors=self.num_errors,
+            num_pending=self.num_pending,
+            num_simulated=self.num_simulated,
+            num_cache_hits=self.num_cache_hits,
+            cache_size=len(self.results.entries),
+            requests_per_second=self.num_requests / uptime if uptime > 0 else 0.0,
+            latency_p50=percentile(0.5),
+            latency_p99=percentile(0.99),
+            latency_max=latencies[-1] if latencies else None,
+        )
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Any:
+        path, _, query = path.partition("?")
+        include_solution = "include_solution=1" in query.split("&")
+
+        if method == "GET" and path == "/stats":
+            return self.stats()
+
+        if method != "POST" or path not in {"/validate", "/validate_save"}:
+            raise _HTTPError(404, "Not Found", f"No route for {method} {path}")
+
+        # Backpressure: shed load rather than queueing without bound
+        if self.num_pending >= self.max_pending:
+            self.num_rejected += 1
+            raise _HTTPError(503, "Service Unavailable", "Too many pending requests")
+
+        self.num_pending += 1
+        start = time.monotonic()
+        try:
+            if path == "/validate":
+                try:
+                    request = json.loads(body)
+                except ValueError as e:
+                    raise _HTTPError(400, "Bad Request", f"Invalid JSON: {e}")
+                if not isinstance(request, dict):
+                    raise _HTTPError(400, "Bad Request", "Expected a JSON object")
+                if include_solution:
+                    request["include_solution"] = True
+                return await self.validate(request)
+            else:
+                return await self.validate_save(body.decode(), include_solution)
+        finally:
+            self.num_pending -= 1
+            self.latencies.append(time.monotonic() - start)
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in {b"\r\n", b"\n", b""}:
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    if version == "HTTP/1.1"
+                    else headers.get("connection", "").lower() == "keep-alive"
+                )
+
+                self.num_requests += 1
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY_SIZE:
+                        raise _HTTPError(413, "Payload Too Large", "Body too large")
+                    body = await reader.readexactly(length)
+                    payload = await self.dispatch(method, path, body)
+                    status, reason = 200, "OK"
+                except _HTTPError as e:
+                    self.num_errors += e.status != 503
+                    status, reason, payload = e.status, e.reason, dict(error=str(e))
+                except Exception as e:
+                    self.num_errors += 1
+                    status, reason = 500, "Internal Server Error"
+                    payload = dict(error=repr(e))
+
+                data = json.dumps(payload).encode()
+                head = (
+                    f"HTTP/1.1 {status} {reason}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    + ("Retry-After: 1\r\n" if status == 503 else "")
+                    + ("" if keep_alive else "Connection: close\r\n")
+                    + "\r\n"
+                )
+                writer.write(head.encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        for sock in server.sockets:
+            print(f"Listening on {sock.getsockname()}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown()
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: Optional[int] = None,
+    cache_size: int = 65536,
+    max_pending: int = 256,
+    levels: Optional[list[Level]] = None,
+):
+    server = ValidationServer(
+        workers=workers, cache_size=cache_size, max_pending=max_pending, levels=levels
+    )
+    asyncio.run(server.serve_forever(host, port))
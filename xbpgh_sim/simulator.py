@@ -1,18 +1,64 @@
 from typing import Optional
 from copy import deepcopy
+from functools import lru_cache
 
 from .models import *
+from .errors import MetalPositionError, StartPositionError
+from .analysis import analyze_rules
+from .compiler import StepFunction, compile_rules
+from .scoring import DistanceWeights, target_scorer
+
+
+__all__ = [
+    "simulate_step",
+    "settled_cells",
+    "simulate_solution",
+    "simulate_metrics",
+    "simulate_final",
+]
+
+
+@lru_cache(maxsize=None)
+def _neighborhoods(width: int, height: int) -> dict[Coords, list[Coords]]:
+    """Each cell along with its in-bounds orthogonal neighbors"""
+    return {
+        loc: [loc]
+        + [
+            loc + d.delta()
+            for d in Direction
+            if (loc + d.delta()).in_bounds(width, height)
+        ]
+        for loc in (Coords(x, y) for x in range(width) for y in range(height))
+    }
+
+
+def simulate_step(
+    prv_state: State,
+    rules: list[Rule],
+    active_rules: Optional[list[int]] = None,
+    settled: Optional[set[Coords]] = None,
+) -> StepResult:
+    # active_rules optionally restricts evaluation to a subset of rule indices
+    # (in priority order), e.g. the live rules found by analyze_rules
+    if active_rules is None:
+        active_rules = list(range(len(rules)))
+
+    # settled optionally gives cells known to do nothing this step unless a
+    # neighbor is divided into or fused earlier in the step, see settled_cells
+    if settled is None:
+        settled = set()
+
+    width, height = prv_state.width, prv_state.height
+    neighborhoods = _neighborhoods(width, height)
 
-
-__all__ = ["simulate_step", "simulate_solution"]
-
-
-def simulate_step(prv_state: State, rules: list[Rule]) -> StepResult:
     nxt_state = deepcopy(prv_state)
     dead_cells = set()
 
+    # Cells whose type or connections in nxt_state were changed during the loop
+    touched: set[Coords] = set()
+
     rules_applied: list[list[Optional[int]]] = [
-        [None for _ in range(5)] for _ in range(4)
+        [None for _ in range(height)] for _ in range(width)
     ]
 
     def try_apply_rule(loc: Coords, rule: Rule) -> bool:
@@ -30,7 +76,7 @@ def simulate_step(prv_state: State, rules: list[Rule]) -> StepResult:
             n_loc = loc + rule.neighbor_dir.delta()
             n_type = (
                 prv_state.cell_types[n_loc.x][n_loc.y]
-                if n_loc.in_bounds()
+                if n_loc.in_bounds(width, height)
                 else CellType.NONE
             )
 
@@ -48,12 +94,14 @@ def simulate_step(prv_state: State, rules: list[Rule]) -> StepResult:
             assert rule.divide_dir is not None
             n_loc = loc + rule.divide_dir.delta()
             if not (
-                n_loc.in_bounds()
+                n_loc.in_bounds(width, height)
                 and nxt_state.cell_types[n_loc.x][n_loc.y] == CellType.NONE
             ):
                 return False
 
             nxt_state.cell_types[n_loc.x][n_loc.y] = nxt_state.cell_types[loc.x][loc.y]
+            touched.add(loc)
+            touched.add(n_loc)
 
             if loc.x != n_loc.x:
                 nxt_state.horz_connected[min(loc.x, n_loc.x)][loc.y] = True
@@ -74,10 +122,13 @@ def simulate_step(prv_state: State, rules: list[Rule]) -> StepResult:
 
             n_loc = loc + rule.fuse_dir.delta()
             if not (
-                n_loc.in_bounds() and nxt_state.cell_types[n_loc.x][n_loc.y].is_living()
+                n_loc.in_bounds(width, height)
+                and nxt_state.cell_types[n_loc.x][n_loc.y].is_living()
             ):
                 return False
 
+            touched.add(loc)
+            touched.add(n_loc)
             if loc.x != n_loc.x:
                 if nxt_state.horz_connected[min(loc.x, n_loc.x)][loc.y]:
                     return False
@@ -100,27 +151,36 @@ def simulate_step(prv_state: State, rules: list[Rule]) -> StepResult:
     did_change = False
     assert prv_state.live_cells is not None
     for loc in prv_state.live_cells:
-        for rule_num, rule in enumerate(rules):
-            if try_apply_rule(loc, rule):
+        if loc in settled and touched.isdisjoint(neighborhoods[loc]):
+            # Everything this cell can look at is as it was when it last did
+            # nothing, so it does nothing again
+            continue
+
+        for rule_num in active_rules:
+            if try_apply_rule(loc, rules[rule_num]):
                 rules_applied[loc.x][loc.y] = rule_num
-                nxt_state.check_state()
                 did_change = True
                 break
         else:
             # This cell does NOOP
             pass
 
+    # Rules only ever add cells and connections, so checking once after all of
+    # them catches anything a check after each rule would, in O(area) per step
+    if did_change:
+        nxt_state.check_state()
+
     for loc in dead_cells:
         nxt_state.cell_types[loc.x][loc.y] = CellType.NONE
 
         if loc.x > 0:
             nxt_state.horz_connected[loc.x - 1][loc.y] = False
-        if loc.x + 1 < 4:
+        if loc.x + 1 < width:
             nxt_state.horz_connected[loc.x][loc.y] = False
 
         if loc.y > 0:
             nxt_state.vert_connected[loc.x][loc.y - 1] = False
-        if loc.y + 1 < 5:
+        if loc.y + 1 < height:
             nxt_state.vert_connected[loc.x][loc.y] = False
 
     assert nxt_state.live_cells is not None
@@ -131,71 +191,228 @@ def simulate_step(prv_state: State, rules: list[Rule]) -> StepResult:
     return StepResult(nxt_state, rules_applied, len(dead_cells), did_change)
 
 
-def simulate_solution(level: Level, solution: Solution) -> SimulationResult:
+def settled_cells(
+    prv_state: State, rules: list[Rule], res: StepResult
+) -> set[Coords]:
+    """Cells which did nothing in a step and whose neighborhood didn't change
+
+    Such cells are guaranteed to do nothing in the following step, as long as
+    none of their neighbors is divided into or fused with during it.
+    """
+    # Every change to types or connections involves a cell which applied a rule,
+    # or the cell it divided into or fused with
+    changed = set()
+    assert prv_state.live_cells is not None
+    for loc in prv_state.live_cells:
+        rule_num = res.rules_applied[loc.x][loc.y]
+        if rule_num is None:
+            continue
+        changed.add(loc)
+        rule = rules[rule_num]
+        if rule.reaction == Reaction.DIVIDE:
+            assert rule.divide_dir is not None
+            changed.add(loc + rule.divide_dir.delta())
+        elif rule.reaction == Reaction.FUSE:
+            assert rule.fuse_dir is not None
+            changed.add(loc + rule.fuse_dir.delta())
+
+    neighborhoods = _neighborhoods(prv_state.width, prv_state.height)
+    assert res.state.live_cells is not None
+    return {
+        loc
+        for loc in res.state.live_cells
+        if res.rules_applied[loc.x][loc.y] is None
+        and changed.isdisjoint(neighborhoods[loc])
+    }
+
+
+def _initial_state(level: Level, solution: Solution) -> State:
+    board = level.board
+    assert (level.target_state.width, level.target_state.height) == (
+        board.width,
+        board.height,
+    )
+
     state = State(
         cell_types=[
             [CellType.METAL if t == CellType.METAL else CellType.NONE for t in a]
             for a in level.target_state.cell_types
         ],
-        horz_connected=[[False for _ in range(5)] for _ in range(3)],
-        vert_connected=[[False for _ in range(4)] for _ in range(4)],
+        horz_connected=[
+            [False for _ in range(board.height)] for _ in range(board.width - 1)
+        ],
+        vert_connected=[
+            [False for _ in range(board.height - 1)] for _ in range(board.width)
+        ],
     )
 
     if solution.metal_coords:
-        assert level.can_place_metal
+        if not level.can_place_metal:
+            raise MetalPositionError(f"{level.level_name} doesn't allow placing metal")
         for loc in solution.metal_coords:
+            # Saved positions are on the game's board, which may not fit a
+            # smaller custom one
+            if not loc.in_bounds(board.width, board.height):
+                raise MetalPositionError(f"Metal at {loc} is off the board")
             state.cell_types[loc.x][loc.y] = CellType.METAL
 
-    if state.cell_types[solution.start_pos.x][solution.start_pos.y] != CellType.NONE:
-        raise ValueError(f"Invalid starting position {solution.start_pos}")
-
-    state.cell_types[solution.start_pos.x][solution.start_pos.y] = CellType.SEED
-    state.live_cells = [solution.start_pos]
+    start = solution.start_pos
+    if (
+        not start.in_bounds(board.width, board.height)
+        or state.cell_types[start.x][start.y] != CellType.NONE
+    ):
+        raise StartPositionError(f"Invalid starting position {start}")
+
+    state.cell_types[start.x][start.y] = CellType.SEED
+    state.live_cells = [start]
+    return state
+
+
+def _metrics(
+    level: Level,
+    solution: Solution,
+    is_correct: bool,
+    num_frames: int,
+    is_stable: bool,
+    num_waste: int,
+) -> Metrics:
+    is_wasteful = num_waste > level.theoretical_min_waste
+    if is_correct:
+        assert num_waste >= level.theoretical_min_waste
 
-    num_rules = sum(r.target_type != CellType.IGNORE for r in solution.rules)
-    num_rules_conditional = sum(
-        r.neighbor_type != CellType.IGNORE for r in solution.rules
+    return Metrics(
+        is_correct=is_correct,
+        num_rules=sum(r.target_type != CellType.IGNORE for r in solution.rules),
+        num_rules_conditional=sum(
+            r.neighbor_type != CellType.IGNORE for r in solution.rules
+        ),
+        num_frames=num_frames,
+        is_stable=is_stable,
+        num_waste=num_waste,
+        is_wasteful=is_wasteful,
     )
 
+
+def _simulation_result(
+    level: Level,
+    solution: Solution,
+    initial: tuple[State, int],
+    frames: list[tuple[StepResult, int]],
+    is_stable: bool,
+) -> SimulationResult:
+    """Collects the metrics and trace of a simulation from its initial state and
+    the result of each step, each along with its packed state"""
+    board = level.board
     num_frames = 1
     num_waste = 0
 
-    states = [state]
-    rules_applied = []
-    for _ in range(11):
-        res = simulate_step(state, solution.rules)
+    state, packed = initial
 
+    states = PackedStates(board.width, board.height)
+    states.append(state, packed)
+    rules_applied = RulesAppliedTrace(board.width, board.height)
+    for res, packed in frames:
         state = res.state
-        states.append(state)
+        states.append(state, packed)
 
         rules_applied.append(res.rules_applied)
 
         num_waste += res.num_waste
         num_frames += res.did_change
 
-    is_stable = not simulate_step(state, solution.rules).did_change
-
     final_state = deepcopy(state)
     final_state.live_cells = None
     is_correct = final_state == level.target_state
 
-    is_wasteful = num_waste > level.theoretical_min_waste
-    if is_correct:
-        assert num_waste >= level.theoretical_min_waste
-
     return SimulationResult(
         level=level,
         solution=solution,
         states=states,
         rules_applied=rules_applied,
         final_state=final_state,
-        metrics=Metrics(
-            is_correct=is_correct,
-            num_rules=num_rules,
-            num_rules_conditional=num_rules_conditional,
-            num_frames=num_frames,
-            is_stable=is_stable,
-            num_waste=num_waste,
-            is_wasteful=is_wasteful,
+        metrics=_metrics(
+            level, solution, is_correct, num_frames, is_stable, num_waste
         ),
     )
+
+
+def _stepper(solution: Solution, board: Board, compiled: bool) -> StepFunction:
+    """The step function simulate_solution uses for a solution"""
+    if compiled:
+        return compile_rules(tuple(solution.rules), board.width, board.height)
+
+    # Rules which can never fire don't affect the simulation
+    live_rules = analyze_rules(solution.rules).live_rules
+    settled: Optional[set[Coords]] = None
+
+    def step(state: State) -> StepResult:
+        nonlocal settled
+        res = simulate_step(state, solution.rules, live_rules, settled)
+        settled = settled_cells(state, solution.rules, res)
+        return res
+
+    return step
+
+
+def simulate_solution(
+    level: Level, solution: Solution, compiled: bool = False
+) -> SimulationResult:
+    """Simulates a solution on a level
+
+    With compiled, steps run through a step function generated for the
+    solution's rules (see compile_rules), which is faster for repeated use of
+    the same rules.
+    """
+    state = _initial_state(level, solution)
+    step = _stepper(solution, level.board, compiled)
+
+    initial = (state, state.pack())
+    frames = []
+    for _ in range(level.board.num_frames):
+        res = step(state)
+        state = res.state
+        frames.append((res, state.pack()))
+
+    is_stable = not step(state).did_change
+    return _simulation_result(level, solution, initial, frames, is_stable)
+
+
+def simulate_metrics(
+    level: Level,
+    solution: Solution,
+    compiled: bool = False,
+    weights: Optional[DistanceWeights] = None,
+) -> tuple[Metrics, float]:
+    """Simulates a solution like simulate_solution, but only keeps its metrics
+
+    Also returns the weighted distance of the final state from the target (see
+    TargetScorer.score), which is 0 exactly when the solution is correct.
+    Skipping the trace makes this the cheaper mode for search.
+    """
+    metrics, packed = simulate_final(level, solution, compiled)
+    return metrics, target_scorer(level, weights).score(packed)
+
+
+def simulate_final(
+    level: Level, solution: Solution, compiled: bool = False
+) -> tuple[Metrics, int]:
+    """Like simulate_metrics, but returns the packed final state instead of its
+    distance, so many final states can be scored at once (see
+    TargetScorer.score_many)
+    """
+    state = _initial_state(level, solution)
+    step = _stepper(solution, level.board, compiled)
+
+    num_frames = 1
+    num_waste = 0
+    for _ in range(level.board.num_frames):
+        res = step(state)
+        state = res.state
+        num_waste += res.num_waste
+        num_frames += res.did_change
+
+    is_stable = not step(state).did_change
+    packed = state.pack()
+    is_correct = packed == level.target_state.pack()
+    metrics = _metrics(level, solution, is_correct, num_frames, is_stable, num_waste)
+    return metrics, packed
@@ -0,0 +1,224 @@
+import dataclasses
+import functools
+import itertools
+import json
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Optional, TextIO
+
+from .models import *
+from .checkpoint import Checkpoint
+from .errors import SolutionError, UnknownLevelError, error_category
+from .export import ResultsWriter
+from .savefile import parse_solution
+from .simulator import simulate_solution
+from .validation import LEVELS_BY_ID, Shard, in_shard, validation_record
+
+
+__all__ = ["parse_record", "validate_record", "validate_stream"]
+
+
+def parse_record(line: str) -> Optional[tuple[int, int, str]]:
+    """Parses "<level_id> <slot> <save_string>" or a save file solution line
+
+    Returns (level_id, slot, save_string), or None for lines without a solution.
+    Raises SolutionError for malformed solution lines.
+    """
+    line = line.strip()
+    if " = " in line:
+        key, val = line.split(" = ", 1)
+        key = key.split(".")
+        if key[0] == "Toronto" and key[1:2] == ["Solution"]:
+            try:
+                _, _, level_id, slot = key
+                return int(level_id), int(slot), val.strip()
+            except ValueError:
+                raise SolutionError(f"Invalid key {'.'.join(key)}") from None
+        return None
+
+    fields = line.split()
+    if not fields:
+        return None
+    try:
+        level_id, slot, save_string = fields
+        return int(level_id), int(slot), save_string
+    except ValueError:
+        raise SolutionError(
+            f"Expected <level_id> <slot> <save_string>, got {line!r}"
+        ) from None
+
+
+def validate_record(
+    index: int,
+    level_id: int,
+    slot: int,
+    save_string: str,
+    include_solution: bool,
+    level: Optional[Level] = None,
+) -> dict:
+    """Validates one record, against level if given or else LEVELS_BY_ID[level_id]"""
+    try:
+        if level is None:
+            if level_id not in LEVELS_BY_ID:
+                raise UnknownLevelError(f"Unknown level ID {level_id}")
+            level = LEVELS_BY_ID[level_id]
+        solution = parse_solution(save_string)
+        metrics = simulate_solution(level, solution).metrics
+    except Exception as e:
+        return dict(
+            index=index,
+            level_id=level_id,
+            slot_id=slot,
+            category=error_category(e),
+            error=repr(e),
+        )
+    return dict(
+        **validation_record(level, slot, solution, metrics, include_solution),
+        index=index,
+    )
+
+
+def validate_stream(
+    lines: Iterable[str],
+    out: TextIO,
+    ordered: bool = False,
+    workers: Optional[int] = None,
+    max_pending: int = 64,
+    include_solution: bool = False,
+    shard: Optional[Shard] = None,
+    levels: Optional[list[Level]] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    resume: bool = False,
+    writer: Optional[ResultsWriter] = None,
+):
+    """Validates records as they are read, writing one JSON result per line
+
+    Results are written as soon as they complete, or in input order if ordered
+    is set. At most max_pending records are in flight, so memory use doesn't
+    grow with the length of the stream. Each result has an "index" field giving
+    the 0-based record number; records which fail have "error" and "category"
+    (see error_category) fields instead of metrics. If shard is given, only
+    records in that shard are validated, keeping their index in the whole
+    stream. levels, if given, replaces LEVELS as the levels records can refer
+    to. With writer, successful results are appended to it instead of out, so
+    only errors are written to out.
+
+    With checkpoint, which needs ordered and a seekable out, the number of
+    input lines done and the sizes of out and writer are saved whenever
+    checkpoint.interval has passed. With resume, lines already done are then
+    skipped and out and writer are truncated to their saved sizes, so the
+    output is the same as that of an uninterrupted run. The checkpoint is
+    removed at the end.
+    """
+    if checkpoint is not None and not ordered:
+        raise ValueError("Checkpoints need ordered output")
+    saved = checkpoint.load() if checkpoint is not None and resume else None
+    num_lines, index = 0, 0
+    if saved is not None:
+        num_lines, index = saved["num_lines"], saved["index"]
+        out.seek(saved["offset"])
+        out.truncate()
+        if writer is not None:
+            writer.truncate(saved["num_rows"])
+        lines = itertools.islice(lines, num_lines, None)
+
+    levels_by_id = (
+        None if levels is None else {level.level_id: level for level in levels}
+    )
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(max_pending)
+    # With ordered, each future along with its save string (for writer), and
+    # the input lines and index after it
+    pending: deque[tuple[Future, Optional[str], int, int]] = deque()
+    # Rows for writer, appended in batches since each append rewrites its header
+    rows: list[tuple[int, int, Optional[str], Metrics]] = []
+
+    def flush_rows():
+        if writer is not None and rows:
+            writer.append(rows)
+            rows.clear()
+
+    def emit(future: Future, save_string: Optional[str]):
+        # A failed future (e.g. from a broken pool) must still free its slot,
+        # or the reading loop would wait for it forever
+        try:
+            result = future.result()
+            if writer is not None and "error" not in result:
+                rows.append(
+                    (
+                        result["level_id"],
+                        result["slot_id"],
+                        save_string,
+                        Metrics(**{name: result[name] for name in _METRIC_NAMES}),
+                    )
+                )
+                if len(rows) >= 256:
+                    flush_rows()
+            else:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+        finally:
+            slots.release()
+
+    def on_done(save_string: Optional[str], future: Future):
+        with lock:
+            if ordered:
+                while pending and pending[0][0].done():
+                    done, done_save_string, done_lines, done_index = pending.popleft()
+                    emit(done, done_save_string)
+                    if checkpoint is not None and checkpoint.due():
+                        flush_rows()
+                        checkpoint.save(
+                            dict(
+                                num_lines=done_lines,
+                                index=done_index,
+                                offset=out.tell(),
+                                num_rows=0 if writer is None else len(writer),
+                            )
+                        )
+            else:
+                emit(future, save_string)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for line in lines:
+            num_lines += 1
+            error = None
+            try:
+                record = parse_record(line)
+            except SolutionError as e:
+                error = dict(index=index, category=error_category(e), error=repr(e))
+                record = None
+            if record is None and error is None:
+                continue
+            if not in_shard(line if record is None else record[2], shard):
+                index += 1
+                continue
+
+            save_string = None if record is None else record[2]
+            slots.acquire()
+            with lock:
+                if record is None:
+                    future: Future = Future()
+                    future.set_result(error)
+                else:
+                    # Custom levels are sent along, since workers only know LEVELS
+                    future = executor.submit(
+                        validate_record,
+                        index,
+                        *record,
+                        include_solution,
+                        None if levels_by_id is None else levels_by_id.get(record[0]),
+                    )
+                if ordered:
+                    pending.append((future, save_string, num_lines, index + 1))
+            # Runs immediately if the future is already done
+            future.add_done_callback(functools.partial(on_done, save_string))
+            index += 1
+
+    flush_rows()
+    if checkpoint is not None:
+        checkpoint.remove()
+
+
+_METRIC_NAMES = [field.name for field in dataclasses.fields(Metrics)]
@@ -0,0 +1,68 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from .models import *
+
+
+__all__ = [
+    "TrajectoryStats",
+    "TrajectoryCounter",
+    "group_by_trajectory",
+    "trajectory_stats",
+]
+
+
+def group_by_trajectory(
+    results: list[SimulationResult],
+) -> dict[tuple[int, int], list[SimulationResult]]:
+    """Groups results by (level_id, trajectory_hash), in order of first appearance"""
+    groups: dict[tuple[int, int], list[SimulationResult]] = defaultdict(list)
+    for result in results:
+        groups[result.level.level_id, result.trajectory_hash].append(result)
+    return dict(groups)
+
+
+@dataclass
+class TrajectoryStats:
+    num_results: int
+    num_trajectories: int
+
+    # Number of distinct trajectories per level_id
+    trajectories_per_level: dict[int, int]
+
+    # Size of the largest equivalence class per level_id
+    largest_class_per_level: dict[int, int]
+
+
+class TrajectoryCounter:
+    """Counts results by trajectory as they are produced, so the results
+    needn't be kept for trajectory_stats"""
+
+    def __init__(self):
+        # Number of results by (level_id, trajectory_hash)
+        self.class_sizes: Counter[tuple[int, int]] = Counter()
+
+    def add(self, result: SimulationResult):
+        self.class_sizes[result.level.level_id, result.trajectory_hash] += 1
+
+    def stats(self) -> TrajectoryStats:
+        trajectories_per_level: dict[int, int] = defaultdict(int)
+        largest_class_per_level: dict[int, int] = defaultdict(int)
+        for (level_id, _), size in self.class_sizes.items():
+            trajectories_per_level[level_id] += 1
+            largest_class_per_level[level_id] = max(
+                largest_class_per_level[level_id], size
+            )
+        return TrajectoryStats(
+            num_results=sum(self.class_sizes.values()),
+            num_trajectories=len(self.class_sizes),
+            trajectories_per_level=dict(trajectories_per_level),
+            largest_class_per_level=dict(largest_class_per_level),
+        )
+
+
+def trajectory_stats(results: list[SimulationResult]) -> TrajectoryStats:
+    counter = TrajectoryCounter()
+    for result in results:
+        counter.add(result)
+    return counter.stats()
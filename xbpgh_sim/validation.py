@@ -0,0 +1,162 @@
+import dataclasses
+import hashlib
+from typing import Iterator, Optional
+
+from .models import *
+from .analysis import analyze_rules
+from .errors import ErrorLog
+from .levels import LEVELS
+from .simulator import simulate_solution
+
+
+__all__ = [
+    "LEVELS_BY_ID",
+    "Shard",
+    "parse_shard",
+    "solution_hash",
+    "shard_of",
+    "in_shard",
+    "validation_record",
+    "type_names",
+    "simulate_save",
+    "validate_save",
+]
+
+
+LEVELS_BY_ID = {level.level_id: level for level in LEVELS}
+
+
+# (index, count), with 0 <= index < count
+Shard = tuple[int, int]
+
+
+def parse_shard(s: str) -> Shard:
+    """Parses "i/N" into (i, N)"""
+    index, _, count = s.partition("/")
+    shard = int(index), int(count)
+    if not 0 <= shard[0] < shard[1]:
+        raise ValueError(f"Invalid shard {s}")
+    return shard
+
+
+def solution_hash(save_string: str) -> int:
+    """64-bit hash, stable across processes, machines and Python versions"""
+    digest = hashlib.sha256(save_string.strip().encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def shard_of(save_string: str, num_shards: int) -> int:
+    return solution_hash(save_string) % num_shards
+
+
+def in_shard(save_string: str, shard: Optional[Shard]) -> bool:
+    return shard is None or shard_of(save_string, shard[1]) == shard[0]
+
+
+def validation_record(
+    level: Level,
+    slot: int,
+    solution: Solution,
+    metrics: Optional[Metrics],
+    include_solution: bool = False,
+    unreachable: Optional[set[CellType]] = None,
+) -> dict:
+    """One entry of the validate_all --json output
+
+    unreachable, if given, is listed as the solution's unreachable target cell
+    types (see RuleAnalysis.unreachable_target_types). metrics is None for
+    solutions rejected for those without simulating, which are only marked as
+    incorrect.
+    """
+    return dict(
+        level_name=level.level_name,
+        level_id=level.level_id,
+        slot_id=slot,
+        **(
+            dict(
+                solution=f"Toronto.Solution.{level.level_id}.0 = {solution.save_string}"
+            )
+            if include_solution
+            else {}
+        ),
+        **(
+            dict(unreachable_target_types=type_names(unreachable))
+            if unreachable is not None
+            else {}
+        ),
+        **(
+            dataclasses.asdict(metrics)
+            if metrics is not None
+            else dict(is_correct=False)
+        ),
+    )
+
+
+def type_names(types: set[CellType]) -> list[str]:
+    return [t.name for t in sorted(types, key=lambda t: t.value)]
+
+
+def simulate_save(
+    solutions: dict[int, dict[int, Solution]],
+    shard: Optional[Shard] = None,
+    levels: Optional[list[Level]] = None,
+    errors: Optional[ErrorLog] = None,
+    skip_unsolvable: bool = False,
+) -> Iterator[tuple[Level, int, Solution, set[CellType], Optional[SimulationResult]]]:
+    """Simulates every solution (in shard) of a parsed save file, in level order
+
+    Yields (level, slot, solution, unreachable, result), where unreachable are
+    the target cell types the rules can never produce, found before simulating.
+    With skip_unsolvable, solutions with any aren't simulated and their result
+    is None. levels defaults to LEVELS, and should match the levels of
+    parse_save_file. With errors (bulk mode), solutions which fail to simulate
+    are recorded there and skipped instead of raising.
+    """
+    for level in LEVELS if levels is None else levels:
+        for slot, solution in solutions[level.level_id].items():
+            if solution.save_string is not None and not in_shard(
+                solution.save_string, shard
+            ):
+                continue
+            unreachable = analyze_rules(solution.rules).unreachable_target_types(level)
+            try:
+                result = (
+                    None
+                    if skip_unsolvable and unreachable
+                    else simulate_solution(level, solution)
+                )
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors.record(e, level_id=level.level_id, slot_id=slot)
+                continue
+            yield level, slot, solution, unreachable, result
+
+
+def validate_save(
+    solutions: dict[int, dict[int, Solution]],
+    include_solution: bool = False,
+    shard: Optional[Shard] = None,
+    levels: Optional[list[Level]] = None,
+    errors: Optional[ErrorLog] = None,
+    skip_unsolvable: bool = False,
+    include_unreachable: bool = False,
+) -> list[dict]:
+    """validate_all --json records of a parsed save file, see simulate_save
+
+    Records list unreachable_target_types with include_unreachable, and always
+    for solutions skipped by skip_unsolvable.
+    """
+    return [
+        validation_record(
+            level,
+            slot,
+            solution,
+            None if result is None else result.metrics,
+            include_solution,
+            unreachable if include_unreachable or result is None else None,
+        )
+        for level, slot, solution, unreachable, result in simulate_save(
+            solutions, shard, levels, errors, skip_unsolvable
+        )
+    ]
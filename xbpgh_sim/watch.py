@@ -0,0 +1,123 @@
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from .models import *
+from .savefile import parse_solution
+from .simulator import simulate_solution
+from .validation import LEVELS_BY_ID
+
+
+__all__ = ["SaveFileUpdate", "SaveFileWatcher"]
+
+
+@dataclass
+class SaveFileUpdate:
+    level: Level
+    slot: int
+
+    # None if the entry was removed
+    solution: Optional[Solution]
+    result: Optional[SimulationResult]
+
+    # Set instead of result if the solution couldn't be parsed or simulated
+    error: Optional[str] = None
+
+
+class SaveFileWatcher:
+    """Revalidates the entries of a save file which changed since the last poll
+
+    A file modified less than settle_time seconds ago, or modified while it was
+    being read, is left for a later poll, so a partially written save isn't
+    mistaken for one with entries removed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        levels: Optional[list[Level]] = None,
+        settle_time: float = 0.2,
+    ):
+        self.path = path
+        self.settle_time = settle_time
+        self.levels_by_id = (
+            LEVELS_BY_ID
+            if levels is None
+            else {level.level_id: level for level in levels}
+        )
+        self.stat_key: Optional[tuple[int, int, int]] = None
+        # Hash of each solution line, by (level_id, slot)
+        self.line_hashes: dict[tuple[int, int], bytes] = {}
+
+    def _stat_key(self) -> Optional[tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # Possibly in the middle of being replaced
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def poll(self) -> list[SaveFileUpdate]:
+        stat_key = self._stat_key()
+        if stat_key is None or stat_key == self.stat_key:
+            return []
+        if time.time_ns() - stat_key[0] < self.settle_time * 1e9:
+            # Possibly still being written
+            return []
+
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        if len(data) != stat_key[1] or self._stat_key() != stat_key:
+            # Written to while being read; retry on the next poll
+            return []
+        self.stat_key = stat_key
+        lines = data.split(b"\n")
+
+        changed = {}
+        line_hashes = {}
+        for line in lines:
+            key, sep, val = line.partition(b" = ")
+            parts = key.strip().split(b".")
+            if not sep or len(parts) != 4 or parts[:2] != [b"Toronto", b"Solution"]:
+                continue
+            if not (parts[2].isdigit() and parts[3].isdigit()):
+                continue
+            entry = (int(parts[2]), int(parts[3]))
+            line_hash = hashlib.blake2b(val.strip(), digest_size=16).digest()
+            line_hashes[entry] = line_hash
+            if self.line_hashes.get(entry) != line_hash:
+                changed[entry] = val.strip().decode()
+
+        removed = self.line_hashes.keys() - line_hashes.keys()
+        self.line_hashes = line_hashes
+
+        updates = []
+        for level_id, slot in sorted(removed):
+            if level_id in self.levels_by_id:
+                level = self.levels_by_id[level_id]
+                updates.append(SaveFileUpdate(level, slot, None, None))
+        for (level_id, slot), save_string in sorted(changed.items()):
+            if level_id not in self.levels_by_id:
+                continue
+            level = self.levels_by_id[level_id]
+            try:
+                solution = parse_solution(save_string)
+                result = simulate_solution(level, solution)
+            except Exception as e:
+                updates.append(SaveFileUpdate(level, slot, None, None, repr(e)))
+                continue
+            updates.append(SaveFileUpdate(level, slot, solution, result))
+        return sorted(updates, key=lambda u: (u.level.level_index, u.slot))
+
+    def watch(self, interval: float = 1.0) -> Iterator[list[SaveFileUpdate]]:
+        """Yields the non-empty results of polling every interval seconds"""
+        while True:
+            updates = self.poll()
+            if updates:
+                yield updates
+            time.sleep(interval)